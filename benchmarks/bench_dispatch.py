@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Per call overhead of the add_* verbs.
+
+Measures
+    resolve   - split_add_args with the precompiled AddArgSpec
+    recompute - the same resolution recomputing the aes order per call
+                (what add_* did before the specs were cached)
+    verb      - dp(plot).add_point(...).pd
+    plotnine  - plot + geom_point(aes(...)) - what the verb ends up doing
+and reports verb - plotnine as the dispatch overhead.
+
+Usage: python benchmarks/bench_dispatch.py [calls]
+"""
+
+import sys
+import timeit
+
+import plotnine as p9
+from dppd import dppd
+from plotnine.data import mtcars
+
+import dppd_plotnine  # noqa: F401
+from dppd_plotnine.dppd_plotnine import (
+    add_arg_spec,
+    never_map,
+    other_args,
+    sensible_aes_order,
+    split_add_args,
+)
+
+dp, X = dppd()
+
+
+def recompute(cls, args, kwargs):
+    for k, v in zip(sensible_aes_order(cls.REQUIRED_AES), args):
+        if k in kwargs or "_" + k in kwargs:
+            raise ValueError(k)
+        kwargs[k] = v
+    mapped, non_mapped, other = {}, {}, {}
+    for k, v in kwargs.items():
+        if k in other_args:
+            other[k] = v
+        elif k in never_map:
+            non_mapped[k] = v
+        elif k.startswith("_"):
+            non_mapped[k[1:]] = v
+        else:
+            mapped[k] = v
+    return mapped, non_mapped, other
+
+
+def per_call(func, calls):
+    return min(timeit.repeat(func, number=calls, repeat=5)) / calls
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    plot = dp(mtcars).p9().pd
+    spec = add_arg_spec(p9.geom_point)
+    results = {
+        "resolve": per_call(
+            lambda: split_add_args(spec, ("mpg", "hp"), {"color": "cyl", "_size": 2}),
+            calls * 10,
+        ),
+        "recompute": per_call(
+            lambda: recompute(
+                p9.geom_point, ("mpg", "hp"), {"color": "cyl", "_size": 2}
+            ),
+            calls * 10,
+        ),
+        "verb": per_call(
+            lambda: dp(plot).add_point("mpg", "hp", color="cyl", _size=2).pd, calls
+        ),
+        "plotnine": per_call(
+            lambda: plot + p9.geom_point(p9.aes(x="mpg", y="hp", color="cyl"), size=2),
+            calls,
+        ),
+    }
+    for name, seconds in results.items():
+        print(f"{name:>10}: {seconds * 1e6:9.1f} us/call")
+    overhead = results["verb"] - results["plotnine"]
+    print(f"{'overhead':>10}: {overhead * 1e6:9.1f} us/call (verb - plotnine)")
+
+
+if __name__ == "__main__":
+    main()
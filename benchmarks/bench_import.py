@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Import time of dppd_plotnine.
+
+Compares a plain 'import dppd_plotnine' (lazy verb registration)
+with an import that resolves every element verb right away -
+which is what importing used to cost.
+
+Usage: python benchmarks/bench_import.py [repeats]
+"""
+
+import statistics
+import subprocess
+import sys
+
+lazy = """
+import time
+import plotnine, dppd, pandas  # not what we are measuring
+start = time.perf_counter()
+import dppd_plotnine
+print(time.perf_counter() - start)
+"""
+
+eager = """
+import time
+import plotnine, dppd, pandas  # not what we are measuring
+start = time.perf_counter()
+import dppd_plotnine
+dppd_plotnine.dppd_plotnine.register_all_verbs()
+print(time.perf_counter() - start)
+"""
+
+
+def measure(code, repeats):
+    timings = []
+    for _ in range(repeats):
+        out = subprocess.check_output([sys.executable, "-c", code], text=True)
+        timings.append(float(out.strip()))
+    return statistics.median(timings)
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    t_lazy = measure(lazy, repeats)
+    t_eager = measure(eager, repeats)
+    print(f"import dppd_plotnine (lazy verbs):  {t_lazy * 1000:.1f} ms")
+    print(f"import dppd_plotnine (all verbs):   {t_eager * 1000:.1f} ms")
+    print(f"speedup: {t_eager / t_lazy:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Verb chain, build, draw and save timings of representative plots.
+
+For each plot and row count we measure
+    chain - dp(df).p9().add_...().pd  (verb dispatch & plot construction)
+    build - plotnine's _build (stats, scales, positions)
+    draw  - plot.draw() (build + matplotlib figure)
+    save  - the save verb to a png
+as the median wall time over --repeat runs, and the peak memory of one
+extra run under tracemalloc (which slows things down, so it's separate).
+
+Results are written as JSON, and can be compared against a stored baseline:
+
+    python benchmarks/bench_render.py --output baseline.json
+    ... change things ...
+    python benchmarks/bench_render.py --baseline baseline.json
+
+which exits with 1 if any timing or peak memory got worse than
+--tolerance times the baseline (default 1.25).
+
+Usage: python benchmarks/bench_render.py [--rows 1e3,1e4,1e5] [--cases scatter,line]
+    [--repeat 3] [--output results.json] [--baseline baseline.json]
+"""
+
+import argparse
+import copy
+import gc
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import plotnine as p9
+from dppd import dppd
+
+import dppd_plotnine  # noqa: F401
+
+dp, X = dppd()
+
+phases = ["chain", "build", "draw", "save"]
+
+
+def make_data(rows, seed=500):
+    rng = np.random.default_rng(seed)
+    groups = 5
+    return pd.DataFrame(
+        {
+            "x": rng.normal(size=rows),
+            "y": rng.normal(size=rows),
+            "t": np.tile(np.arange(rows // groups + 1), groups)[:rows].astype(float),
+            "walk": np.cumsum(rng.normal(size=rows)),
+            "cat": rng.choice([f"c{i}" for i in range(10)], rows),
+            "group": np.repeat([f"g{i}" for i in range(groups)], rows // groups + 1)[
+                :rows
+            ],
+        }
+    )
+
+
+# name -> df -> plot. Keep these stable, or baselines stop being comparable.
+cases = {
+    "scatter": lambda df: dp(df).p9().add_point("x", "y", color="cat").pd,
+    "line": lambda df: dp(df).p9().add_line("t", "walk", color="group").pd,
+    "boxplot": lambda df: dp(df).p9().add_boxplot("cat", y="y").pd,
+    "bar": lambda df: dp(df).p9().add_bar("cat", stat="count").pd,
+    "faceted": lambda df: (
+        dp(df).p9().add_point("x", "y", color="cat").facet_wrap("group").pd
+    ),
+    "cyberpunk_scatter": lambda df: (
+        dp(df).p9().cyberpunk().add_scatter("x", "y", color="cat").pd
+    ),
+    "cyberpunk_line": lambda df: (
+        dp(df).p9().cyberpunk().add_line("t", "walk", color="group").pd
+    ),
+    "stripes": lambda df: (
+        dp(df).p9().annotation_stripes_dppd().add_jitter("cat", "y", _size=0.5).pd
+    ),
+}
+
+
+def _phase_funcs(case, df, target):
+    plot = cases[case](df)
+
+    def chain():
+        cases[case](df)
+
+    def build():
+        copy.deepcopy(plot)._build()
+
+    def draw():
+        plt.close(plot.draw())
+
+    def save():
+        dp(plot).save(target)
+
+    return {"chain": chain, "build": build, "draw": draw, "save": save}
+
+
+def _time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def _peak_memory(func):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(rows, case_names, repeat, log=sys.stderr):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp) / "bench.png"
+        for n in rows:
+            df = make_data(n)
+            for case in case_names:
+                funcs = _phase_funcs(case, df, target)
+                entry = {}
+                for phase in phases:
+                    entry[phase] = {
+                        "seconds": _time(funcs[phase], repeat),
+                        "peak_bytes": _peak_memory(funcs[phase]),
+                    }
+                    print(
+                        f"{case:>18} {n:>9} {phase:>5} "
+                        f"{entry[phase]['seconds']:9.3f}s "
+                        f"{entry[phase]['peak_bytes'] / 2**20:9.1f}MB",
+                        file=log,
+                    )
+                results[f"{case}/{n}"] = entry
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "plotnine": p9.__version__,
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print per phase time and peak memory ratios against baseline.
+    Returns what got worse than tolerance x baseline"""
+    regressions = []
+    for key, entry in sorted(results.items()):
+        if key not in baseline:
+            continue
+        for phase in phases:
+            old = baseline[key].get(phase)
+            if not old:
+                continue
+            line = f"{key:>28} {phase:>5}"
+            for measure, label in ("seconds", "time"), ("peak_bytes", "memory"):
+                ratio = entry[phase][measure] / max(old[measure], 1e-9)
+                line += f" {label} {ratio:6.2f}x"
+                if ratio > tolerance:
+                    line += " (worse)"
+                    regressions.append(f"{key} {phase} {label}")
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", default="1e3,1e4,1e5")
+    parser.add_argument("--cases", default=",".join(cases))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    args = parser.parse_args()
+
+    rows = [int(float(r)) for r in args.rows.split(",")]
+    case_names = args.cases.split(",")
+    unknown = set(case_names) - set(cases)
+    if unknown:
+        parser.error(f"unknown cases {sorted(unknown)}, known: {sorted(cases)}")
+
+    results = run(rows, case_names, args.repeat)
+    if args.output:
+        args.output.write_text(
+            json.dumps({"environment": environment(), "results": results}, indent=2)
+        )
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline["environment"] != environment():
+            print("warning: baseline was recorded in a different environment")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(
+                f"{len(regressions)} measurements worse than {args.tolerance}x baseline"
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import importlib
 
 from . import geoms  # noqa: F401
 from . import dppd_plotnine  # noqa:F401
@@ -7,4 +8,29 @@ from . import shared
 
 many_cat_colors = shared.many_cat_colors
 
+# name -> module, imported on first use - batch pulls in
+# concurrent.futures & multiprocessing, most sessions never need those
+_lazy_exports = {
+    "PlotTemplate": "batch",
+    "RenderQueue": "batch",
+    "SaveResult": "batch",
+    "configure_render_queue": "batch",
+    "save_many": "batch",
+    "save_pdf_pages": "batch",
+    "wait_all": "batch",
+    "p9_file": "column_files",
+    "many_categories": "palettes",
+}
 
+
+def __getattr__(name):
+    if name not in _lazy_exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module("." + _lazy_exports[name], __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_exports))
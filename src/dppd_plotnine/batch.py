@@ -0,0 +1,533 @@
+import collections
+import concurrent.futures
+import copy
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotnine as p9
+from dppd import register_verb
+from plotnine.scales.scale_continuous import scale_continuous
+
+from .dppd_plotnine import (
+    _prepared,
+    _with_data,
+    render_lock,
+    resolve_save_kwargs,
+    save,
+    with_data,
+)
+
+# rendering many plots at once - one process per core, or in the background
+
+
+SaveResult = collections.namedtuple("SaveResult", ["filename", "error"])
+SaveResult.__doc__ = """Outcome of saving one plot in save_many.
+error is None on success, otherwise the formatted traceback"""
+
+
+def _worker_rc():
+    """This process' matplotlib rcParams for _init_worker - the workers are
+    not forked from it. (The plots carry their theme themselves.)"""
+    if "matplotlib" not in sys.modules:  # still the defaults
+        return None
+    rc = dict(sys.modules["matplotlib"].rcParams.copy())
+    rc.pop("backend", None)
+    return rc
+
+
+def _init_worker(rc=None):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    if rc:
+        matplotlib.rcParams.update(rc)
+
+
+def _process_context():
+    # never fork - other threads of the forking process may hold locks
+    # (a render in progress, matplotlib's font cache...)
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn"
+    )
+
+
+def _save_job(job):
+    plot, filename, kwargs = job
+    try:
+        save(plot, filename, **kwargs)
+        return SaveResult(filename, None)
+    except Exception:  # noqa: BLE001 - reported in the SaveResult
+        return SaveResult(filename, traceback.format_exc())
+
+
+def _job_result(future, filename):
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        raise
+    except Exception:  # noqa: BLE001 - e.g. an unpicklable plot, reported
+        return SaveResult(filename, traceback.format_exc())
+
+
+def _shipped(plot):
+    """plot as it is pickled to a worker - pruned / categorized here,
+    so only the referenced columns travel. Plots started from a file
+    read their columns in the worker (save loads them)."""
+    if getattr(plot, "column_source", None) is not None:
+        return plot
+    return _prepared(plot)
+
+
+def _normalize_job(job):
+    """(plot, filename, kwargs) ready for _save_job - or the SaveResult
+    of a plot that failed to prepare, which fails on its own"""
+    if len(job) == 2:
+        plot, filename = job
+        kwargs = {}
+    else:
+        plot, filename, kwargs = job
+    try:
+        plot = _shipped(plot)
+    except Exception:  # noqa: BLE001 - reported in the SaveResult
+        return SaveResult(filename, traceback.format_exc())
+    return plot, filename, dict(kwargs) if kwargs else {}
+
+
+def save_many(plots, jobs=None):
+    """Save many plots in parallel.
+
+    plots yields (plot, filename) or (plot, filename, kwargs)
+    tuples - the arguments you would pass to .save().
+    render_args and size presets are honoured exactly like .save() does.
+
+    jobs is the number of worker processes (default: os.cpu_count()),
+    jobs=1 renders in this process.
+
+    Returns a list of SaveResult(filename, error), in input order.
+    A plot that fails to render does not stop the others,
+    its error is the formatted traceback.
+    At most 2 * jobs plots are waiting for or in a worker at a time,
+    the next one is taken from plots as one finishes.
+
+    Plots are pickled to the workers (started by a fork server where
+    available, spawned otherwise), their expression environment keeps
+    modules, module level functions and scalars - see PicklableEnvironment.
+    Plots started with p9(prune=True) / p9(categorize=True) are prepared
+    before pickling, plots started from a file (p9_file) read their
+    columns in the worker. A plot that fails to prepare fails on its own.
+    The workers take over this process' matplotlib rcParams as they are
+    when save_many is called.
+    A worker that dies (e.g. killed for lack of memory) raises
+    concurrent.futures.process.BrokenProcessPool.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    # plots is read as the workers catch up - a generator's plots (and their
+    # DataFrames) are made as they are needed, not all up front
+    todo = map(_normalize_job, plots)
+    first = list(itertools.islice(todo, jobs))
+    jobs = min(jobs, len(first))
+    todo = itertools.chain(first, todo)
+    if jobs <= 1:
+        return [job if isinstance(job, SaveResult) else _save_job(job) for job in todo]
+
+    with concurrent.futures.ProcessPoolExecutor(
+        jobs,
+        mp_context=_process_context(),
+        initializer=_init_worker,
+        initargs=(_worker_rc(),),
+    ) as executor:
+        results = []
+        running = {}  # future -> (index, filename)
+        for index, job in enumerate(todo):
+            if isinstance(job, SaveResult):
+                results.append(job)
+                continue
+            results.append(None)
+            if len(running) >= 2 * jobs:
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    done_index, filename = running.pop(future)
+                    results[done_index] = _job_result(future, filename)
+            running[executor.submit(_save_job, job)] = index, job[1]
+        for future, (done_index, filename) in running.items():
+            results[done_index] = _job_result(future, filename)
+        return results
+
+
+# one verb chain, many DataFrames
+
+
+class PlotTemplate:
+    """A verb chain recorded once and replayed against many DataFrames.
+
+    template = PlotTemplate(dp(samples[0]).p9().add_point('x', 'y')...pd)
+    template(df) -> the plot on df (see the with_data verb)
+    template.save_many(((df, filename), ...)) -> list of SaveResult
+
+    Replaying swaps the data and shares everything else - much cheaper than
+    running the chain again. Layers with their own data= keep it.
+    """
+
+    def __init__(self, plot):
+        if not isinstance(plot, p9.ggplot):
+            raise TypeError(f"PlotTemplate needs a ggplot, got {type(plot)}")
+        self.plot = plot
+
+    def __call__(self, df):
+        return with_data(self.plot, df)
+
+    def jobs(self, frames, **kwargs):
+        """Yield save_many jobs for frames - (df, filename) or
+        (df, filename, kwargs) tuples. kwargs are defaults for every save."""
+        for frame in frames:
+            if len(frame) == 2:
+                df, filename = frame
+                job_kwargs = kwargs
+            else:
+                df, filename, job_kwargs = frame
+                job_kwargs = {**kwargs, **job_kwargs}
+            # save deep copies the shared parts before building
+            yield _with_data(self.plot, df), filename, job_kwargs
+
+    def save_many(self, frames, jobs=None, **kwargs):
+        """Render the template for each (df, filename[, kwargs]) in frames,
+        see save_many. kwargs are passed to every save."""
+        return save_many(self.jobs(frames, **kwargs), jobs=jobs)
+
+
+# huge facet plots, a page of panels at a time
+
+
+def _frozen_scales(built):
+    """The trained scales of a built plot, limited to what they were
+    trained on - so every page maps data to the same positions & colors.
+    Position scales only if the facet keeps them fixed."""
+    res = []
+    for scale in built.scales:
+        if not scale.is_empty() and not {"x", "y"} & set(scale.aesthetics):
+            res.append(scale)
+    if not built.facet.free["x"]:
+        res.append(built.layout.panel_scales_x[0])
+    if not built.facet.free["y"]:
+        res.append(built.layout.panel_scales_y[0])
+    frozen = []
+    for scale in res:
+        clone = scale.clone()
+        limits = scale.final_limits
+        if isinstance(scale, scale_continuous):
+            # final_limits are transformed - set them in data space,
+            # the way limits= does, or a transform applies twice
+            limits = tuple(scale.inverse(np.asarray(limits)))
+            # older plotnine's limits property transforms on assignment
+            if not isinstance(getattr(type(clone), "limits", None), property):
+                limits = clone._prep_limits(limits)
+        clone.limits = limits
+        frozen.append(clone)
+    return frozen
+
+
+def _level_key(levels):
+    # NaN is a facet level of its own, but never equal to itself
+    return tuple(None if pd.isna(v) else v for v in levels)
+
+
+def _facet_groups(df, by):
+    """{facet levels: row positions} of df - grouped once for all pages.
+    None if df is shown on every panel"""
+    if not isinstance(df, pd.DataFrame) or not set(by) <= set(df.columns):
+        return None
+    groups = df.groupby(by, observed=True, sort=False, dropna=False).indices
+    return {
+        _level_key(key if isinstance(key, tuple) else (key,)): rows
+        for key, rows in groups.items()
+    }
+
+
+def _facet_subset(df, groups, keys):
+    """The rows of df belonging to the facet levels in keys"""
+    if groups is None:
+        return df
+    rows = [groups[key] for key in map(_level_key, keys) if key in groups]
+    return df.iloc[np.sort(np.concatenate(rows))] if rows else df.iloc[:0]
+
+
+def facet_pages(plot, per_page=16):
+    """Split a facet_wrap / facet_grid plot into plots of per_page panels
+    (facet_wrap) or per_page rows of panels (facet_grid, columns without rows).
+
+    The whole plot is built once to train the scales, every page gets
+    those scales with fixed limits, so positions (unless the facet frees
+    them), colors and legends agree across pages.
+    Returns a list of plots - only hand them to save,
+    they share their layers with plot.
+    """
+    facet = plot.facet
+    if isinstance(facet, p9.facet_wrap):
+        by = list(facet.vars)
+    elif isinstance(facet, p9.facet_grid):
+        by = list(facet.rows) or list(facet.cols)
+    else:
+        raise TypeError("facet_pages needs a facet_wrap or facet_grid plot")
+    plot = _prepared(plot)
+    missing = [v for v in by if v not in plot.data.columns]
+    if missing:
+        raise ValueError(f"facet_pages can only split on data columns, not {missing}")
+    built = copy.deepcopy(plot)
+    built._build()
+    scales = _frozen_scales(built)
+    levels = list(
+        built.layout.layout[by].drop_duplicates().itertuples(index=False, name=None)
+    )
+    groups = _facet_groups(plot.data, by)
+    layer_groups = [_facet_groups(layer._data, by) for layer in plot.layers]
+
+    pages = []
+    for start in range(0, len(levels), per_page):
+        keys = levels[start : start + per_page]
+        page = _with_data(plot, _facet_subset(plot.data, groups, keys))
+        page.layers = copy.copy(plot.layers)
+        for i, layer in enumerate(page.layers):
+            if isinstance(layer._data, pd.DataFrame):
+                page.layers[i] = copy.copy(layer)
+                page.layers[i]._data = _facet_subset(layer._data, layer_groups[i], keys)
+        kept = [
+            s
+            for s in plot.scales
+            if not any(s.aesthetics == f.aesthetics for f in scales)
+        ]
+        page.scales = type(plot.scales)(kept + scales)
+        pages.append(page)
+    return pages
+
+
+def _numbered(filename, page, count):
+    filename = str(filename)
+    if "{page" in filename:
+        return filename.format(page=page)
+    path = Path(filename)
+    return str(path.with_name(f"{path.stem}_{page:0{len(str(count))}d}{path.suffix}"))
+
+
+@register_verb("save_facets", types=p9.ggplot)
+def save_facets(plot, filename, per_page=16, jobs=None, **kwargs):
+    """Save a facet_wrap / facet_grid plot as pages of per_page panels
+    (facet_grid: rows of panels), with scales shared across pages
+    - see facet_pages.
+
+    filename 'x.pdf' writes one multi-page PDF (rendered in this process),
+    anything else one file per page, rendered in jobs worker processes
+    (see save_many): 'x.png' -> x_1.png, x_2.png...,
+    or use a '{page}' placeholder ('x_{page:04d}.png').
+
+    kwargs are passed to every save (render_args and size presets apply).
+    Returns a list of SaveResult.
+    """
+    pages = facet_pages(plot, per_page)
+    if Path(str(filename)).suffix.lower() == ".pdf" and "{page" not in str(filename):
+        save_pdf_pages(pages, filename, **kwargs)
+        return [SaveResult(filename, None)]
+    return save_many(
+        [
+            (page, _numbered(filename, i, len(pages)), kwargs)
+            for i, page in enumerate(pages, 1)
+        ],
+        jobs=jobs,
+    )
+
+
+# many plots into one PDF
+
+
+# save's own kwargs - everything else goes to savefig
+_not_for_savefig = (
+    "verbose",
+    "cache",
+    "profile",
+    "reuse_figure",
+    "limitsize",
+    "format",
+)
+
+
+def save_pdf_pages(plots, filename, **kwargs):
+    """Save plots into one PDF, one plot per page.
+
+    plots may be a generator - each plot is drawn, appended to the PDF
+    and dropped before the next one is requested, so memory does not
+    grow with the number of pages.
+
+    kwargs are save's, merged with each plot's render_args per page:
+    size='A4' (A1..A7 portrait, a1..a7 landscape) or width & height
+    (in units - 'in', the default, 'cm' or 'mm') set the page size,
+    dpi the resolution of rasterized parts,
+    the rest goes to savefig. Plots started with p9(prune=True) /
+    p9(categorize=True) are prepared as save would.
+
+    Returns the number of pages written.
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+    from plotnine._utils import to_inches
+    from plotnine._utils.context import plot_context
+
+    if kwargs.get("path"):
+        filename = Path(kwargs["path"]) / filename
+    kwargs = {k: v for k, v in kwargs.items() if k != "path"}
+    pages = 0
+    with PdfPages(filename) as pdf:
+        for plot in plots:
+            page_kwargs = resolve_save_kwargs(plot, kwargs)
+            for key in _not_for_savefig:
+                page_kwargs.pop(key, None)
+            units = page_kwargs.pop("units", "in")
+            sizing = {}
+            if "width" in page_kwargs or "height" in page_kwargs:
+                width, height = plot.theme.getp("figure_size")
+                if "width" in page_kwargs:
+                    width = to_inches(page_kwargs.pop("width"), units)
+                if "height" in page_kwargs:
+                    height = to_inches(page_kwargs.pop("height"), units)
+                sizing["figure_size"] = (width, height)
+            if "dpi" in page_kwargs:
+                sizing["dpi"] = page_kwargs.pop("dpi")
+            # + deep copies - draw would change the caller's plot otherwise
+            page = _prepared(plot) + p9.theme(**sizing)
+            with render_lock:
+                figure = page.draw()  # closed by draw, pdf only needs the object
+                with plot_context(page).rc_context:
+                    pdf.savefig(figure, **page_kwargs)
+            del page, figure, plot
+            pages += 1
+    return pages
+
+
+# rendering in the background while the caller goes on preparing data
+
+
+def _save_in_background(plot, args, kwargs):
+    save(plot, *args, **kwargs)
+
+
+class RenderQueue:
+    """A bounded queue of plots to be saved in the background.
+
+    workers: number of threads (or processes) rendering
+    max_pending: how many plots may wait for a worker,
+        submit() blocks once that many are queued (back-pressure).
+        Defaults to 2 * workers.
+    processes: render in worker processes instead of threads.
+        Threads take turns drawing (matplotlib is not thread safe),
+        so they overlap rendering with the caller's work, not with each other.
+        Processes render truly parallel. The plots are pickled to them,
+        their expression environment keeps modules, module level functions
+        and scalars, but not local variables (see PicklableEnvironment).
+    """
+
+    def __init__(self, workers=1, max_pending=None, processes=False):
+        if max_pending is None:
+            max_pending = 2 * workers
+        self.workers = workers
+        self.max_pending = max_pending
+        self.processes = processes
+        if processes:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                workers,
+                mp_context=_process_context(),
+                initializer=_init_worker,
+                initargs=(_worker_rc(),),
+            )
+        else:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                workers, thread_name_prefix="dppd_plotnine_render"
+            )
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        # submitted, not yet seen by wait_all - minus those that succeeded
+        # (a dict for submission order)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+    def submit(self, plot, *args, **kwargs):
+        """Queue plot.save(*args, **kwargs), blocking while the queue is full.
+
+        Returns a concurrent.futures.Future that resolves to None,
+        or raises what save raised."""
+        plot = _prepared(plot)
+        self._slots.acquire()
+        try:
+            future = self.executor.submit(_save_in_background, plot, args, kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._pending_lock:
+            self._pending[future] = None
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        # failures stay pending, so wait_all raises them
+        if future.cancelled() or future.exception() is None:
+            with self._pending_lock:
+                self._pending.pop(future, None)
+        self._slots.release()
+
+    def wait_all(self):
+        """Block until every submitted plot is rendered.
+        Raises the first exception any of them raised since the last
+        wait_all - including those that failed before it was called."""
+        with self._pending_lock:
+            futures = list(self._pending)
+            self._pending.clear()
+        concurrent.futures.wait(futures)
+        for future in futures:
+            if not future.cancelled():
+                future.result()
+        return futures
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+_render_queue = None
+
+
+def configure_render_queue(workers=1, max_pending=None, processes=False):
+    """(Re)create the queue used by the save_async verb.
+    See RenderQueue for the arguments."""
+    global _render_queue
+    if _render_queue is not None:
+        _render_queue.shutdown()
+    _render_queue = RenderQueue(workers, max_pending, processes)
+    return _render_queue
+
+
+def get_render_queue():
+    if _render_queue is None:
+        configure_render_queue()
+    return _render_queue
+
+
+@register_verb("save_async", types=p9.ggplot)
+def save_async(plot, *args, **kwargs):
+    """Save a plot in the background - same arguments as save.
+
+    Returns a concurrent.futures.Future. Blocks only if the render queue
+    is full, see configure_render_queue and wait_all."""
+    return get_render_queue().submit(plot, *args, **kwargs)
+
+
+def wait_all():
+    """Wait for all plots queued with save_async"""
+    if _render_queue is None:
+        return []
+    return _render_queue.wait_all()
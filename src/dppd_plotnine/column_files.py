@@ -0,0 +1,91 @@
+from pathlib import Path
+
+from .dppd_plotnine import _start_plot, arrow_to_pandas
+
+# plotting straight from Parquet / Feather / Arrow IPC files
+#
+# The plot starts out with an empty DataFrame of the file's schema -
+# enough for the verbs to chain - and a column_source. Saving
+# (load_columns) reads just the columns the finished plot references.
+
+formats = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+    ".ipc": "feather",
+}
+
+
+class ColumnFile:
+    """Reads columns from a Parquet or Feather / Arrow IPC file,
+    memory-mapped.
+
+    Uncompressed Feather / Arrow IPC columns are used in place,
+    without reading them into memory first.
+    """
+
+    def __init__(self, path, format=None):
+        self.path = Path(path)
+        if format is None:
+            try:
+                format = formats[self.path.suffix.lower()]
+            except KeyError:
+                raise ValueError(
+                    f"Can't tell the format of {self.path} - "
+                    "pass format='parquet' or 'feather'"
+                )
+        if format not in ("parquet", "feather"):
+            raise ValueError("format must be 'parquet' or 'feather'")
+        self.format = format
+
+    def schema(self):
+        import pyarrow
+
+        if self.format == "parquet":
+            import pyarrow.parquet
+
+            return pyarrow.parquet.read_schema(self.path, memory_map=True)
+        with pyarrow.memory_map(str(self.path)) as source:
+            return pyarrow.ipc.open_file(source).schema
+
+    def read(self, columns=None):
+        """columns (all if None) as DataFrame of Arrow-backed columns"""
+        if self.format == "parquet":
+            import pyarrow.parquet
+
+            table = pyarrow.parquet.read_table(
+                self.path, columns=columns, memory_map=True
+            )
+        else:
+            import pyarrow.feather
+
+            table = pyarrow.feather.read_table(
+                self.path, columns=columns, memory_map=True
+            )
+        return arrow_to_pandas(table)
+
+    def __deepcopy__(self, memo):
+        # plotnine deep copies the plot on every +
+        return self
+
+    def __repr__(self):
+        return f"ColumnFile({str(self.path)!r}, {self.format!r})"
+
+
+def p9_file(path, mapping=None, format=None, prune=True, categorize=False):
+    """Start a plot from a Parquet or Feather / Arrow IPC file, reading
+    only the columns the finished plot references once it's saved.
+
+        dp(p9_file('big.parquet')).add_point('x', 'y').save('x.png')
+
+    Only the schema is read now - plot.data is an empty DataFrame
+    with the file's columns until then.
+    Saving (save, render_bytes, save_many...) reads the columns,
+    call load_columns() to draw it with plotnine directly.
+    """
+    source = ColumnFile(path, format)
+    empty = arrow_to_pandas(source.schema().empty_table())
+    res = _start_plot(empty, mapping, prune, categorize, depth=2)
+    res.column_source = source
+    return res
@@ -1,24 +1,363 @@
+import collections
+import copy
+import functools
+import importlib
+import io
+import pickle
+import sys
+import threading
+import types
+
+import pandas as pd
 import plotnine as p9
+from dppd import base as dppd_base
 from dppd import register_verb
-import pandas as pd
-from patsy import EvalEnvironment
-from . import geoms
 
+from . import geoms
 
 # this establishes the p9-dppd support
 
 
 @register_verb("p9", types=pd.DataFrame)
-def p9_DataFrame(df, mapping=None):
+def p9_DataFrame(df, mapping=None, prune=False, categorize=False):
+    """Start a plot from df.
+
+    prune=True drops all columns the finished plot does not reference
+    (see prune_columns) when it is saved - or pickled to a render worker.
+
+    categorize=True turns mapped string columns into Categoricals
+    (see categorize_columns) when it is saved.
+    """
+    return _start_plot(df, mapping, prune, categorize)
+
+
+def _start_plot(df, mapping, prune, categorize, depth=3):
+    # captures the environment depth frames up - whoever called the p9 verb
+    environment = PicklableEnvironment.capture(depth)
     try:
-        return p9.ggplot(
-            mapping=mapping, data=df, environment=EvalEnvironment.capture(2)
-        )
+        res = p9.ggplot(mapping=mapping, data=df, environment=environment)
     except TypeError as e:
-        if "environment" in str(e):  # support for plotnine > 0.13
+        # support for plotnine > 0.13
+        if "environment" in str(e):
             res = p9.ggplot(mapping=mapping, data=df)
-            res.environment = p9.mapping._env.Environment.capture(2)
-            return res
+            res.environment = environment
+        else:
+            raise
+    if prune:
+        res.prune_columns = True
+    if categorize:
+        res.categorize_columns = True
+    return res
+
+
+try:
+    from plotnine.mapping._env import Environment as _Environment
+except ImportError:  # plotnine < 0.13
+    from patsy import EvalEnvironment as _Environment
+
+
+class _Module:
+    """A module in a pickled environment - imported again on unpickling"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __reduce__(self):
+        return (importlib.import_module, (self.name,))
+
+
+def _picklable(value):
+    """Whether value survives pickling cheaply - scalars,
+    and functions / classes pickled by reference"""
+    import numpy as np
+
+    if isinstance(value, (bool, int, float, complex, str, bytes, np.generic)):
+        return True
+    if value is None:
+        return True
+    if isinstance(
+        value, (types.FunctionType, types.BuiltinFunctionType, type, np.ufunc)
+    ):
+        try:
+            pickle.dumps(value)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return False
+        return True
+    return False
+
+
+def _picklable_namespace(namespaces):
+    """The variables of stacked namespaces that a pickled plot keeps:
+    modules (by name), module level functions & classes and scalars.
+    Shadowed names stay shadowed - a dropped local hides the global."""
+    res = {}
+    seen = set()
+    for namespace in namespaces:
+        for name, value in namespace.items():
+            if name in seen:
+                continue
+            seen.add(name)
+            if isinstance(value, types.ModuleType):
+                res[name] = _Module(value.__name__)
+            elif _picklable(value):
+                res[name] = value
+    return res
+
+
+class PicklableEnvironment(_Environment):
+    """The environment aes expressions are evaluated in.
+
+    Pickles with the modules, module level functions and scalars
+    of its namespaces (plotnine's own environment pickles empty,
+    so 'np.log(x)' can't be evaluated in a render worker).
+    Data frames, local functions, etc. are dropped.
+    """
+
+    def __reduce__(self):
+        namespaces = getattr(self, "namespaces", None)
+        if namespaces is None:  # patsy
+            namespaces = self._namespaces
+        return (type(self), ([_picklable_namespace(namespaces)],))
+
+    def __deepcopy__(self, memo):
+        # shared, like the plot's data
+        return self
+
+
+def arrow_to_pandas(table):
+    """A pyarrow.Table as pandas DataFrame of Arrow-backed columns.
+
+    The columns wrap the table's buffers - no data is copied.
+    Dictionary columns become Categoricals (copying just their codes).
+    """
+    import pyarrow
+
+    def types_mapper(dtype):
+        if pyarrow.types.is_dictionary(dtype):
+            return None
+        return pd.ArrowDtype(dtype)
+
+    return table.to_pandas(types_mapper=types_mapper)
+
+
+def p9_Table(table, mapping=None, prune=True, categorize=False):
+    """Start a plot from a pyarrow.Table, without copying it.
+
+    The plot's data are Arrow-backed pandas columns (see arrow_to_pandas).
+    prune defaults to True - only the referenced columns are
+    handed on to plotnine (and converted to numpy) when it is saved.
+    """
+    return _start_plot(arrow_to_pandas(table), mapping, prune, categorize)
+
+
+def p9_polars(df, mapping=None, prune=True, categorize=False):
+    """Start a plot from a polars DataFrame, see p9_Table"""
+    return _start_plot(arrow_to_pandas(df.to_arrow()), mapping, prune, categorize)
+
+
+# top level module -> (type name, p9 verb) for optional libraries.
+# Importing them cost more than importing us (polars ~90ms), so p9 is
+# registered once dppd meets one of their objects - which means the
+# library is in sys.modules already.
+lazy_types = {
+    "pyarrow": ("Table", p9_Table),
+    "polars": ("DataFrame", p9_polars),
+}
+
+# resolving a lazy type / verb pops it, then registers it - other threads
+# must not look in between (and find it neither pending nor registered).
+# Reentrant: register_verb looks the verb up again.
+registry_lock = threading.RLock()
+
+
+def _register_lazy_type(module_name):
+    type_name, func = lazy_types.pop(module_name)
+    register_verb("p9", types=getattr(sys.modules[module_name], type_name))(func)
+
+
+def _resolve_type(typ):
+    """Register p9 for typ if it belongs to one of the lazy_types' libraries"""
+    module_name = (getattr(typ, "__module__", None) or "").partition(".")[0]
+    with registry_lock:
+        if module_name not in lazy_types or module_name not in sys.modules:
+            return False
+        _register_lazy_type(module_name)
+        return True
+
+
+class LazyTypeSet(set):
+    """dppd's set of known types, resolving lazy_types on first lookup"""
+
+    def __contains__(self, typ):
+        if not set.__contains__(self, typ):
+            _resolve_type(typ)  # or wait for the thread resolving it
+        return set.__contains__(self, typ)
+
+
+def _expression_names(expr):
+    """Names an aes / facet expression could read from the data"""
+    import ast
+
+    if expr is None:
+        return set()
+    if isinstance(expr, (list, tuple)):
+        return set().union(*[_expression_names(e) for e in expr])
+    if isinstance(expr, p9.mapping.evaluation.stage):
+        return _expression_names([expr.start, expr.after_stat, expr.after_scale])
+    if not isinstance(expr, str):  # arrays, constants...
+        return set()
+    # plotnine looks a string up as column name before evaluating it
+    try:
+        tree = ast.parse(expr.strip(), mode="eval")
+    except SyntaxError:
+        return {expr}
+    return {expr} | {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+
+def referenced_columns(plot):
+    """The columns of plot.data that aes mappings, facets
+    and layers reference, in data order.
+
+    None if that can't be told - a layer derives its data from plot.data
+    with a function.
+    """
+    exprs = list(plot.mapping.values())
+    for layer in plot.layers:
+        layer_data = layer._data  # what the layer was given, before setup
+        if callable(layer_data):
+            return None
+        if layer_data is None:
+            exprs.extend(layer.mapping.values())
+    for attr in ("vars", "rows", "cols"):
+        exprs.extend(getattr(plot.facet, attr, None) or [])
+    names = _expression_names(exprs)
+    return [c for c in plot.data.columns if c in names]
+
+
+@register_verb("prune_columns", types=p9.ggplot)
+def prune_columns(plot):
+    """Restrict the plot's data to the columns it references.
+
+    Call after all add_* - later layers can only use what's left.
+    Returns the plot unchanged if its column references can't be analyzed.
+    """
+    if not isinstance(plot.data, pd.DataFrame):
+        return plot
+    columns = referenced_columns(plot)
+    if columns is None or len(columns) == len(plot.data.columns):
+        return plot
+    pruned = copy.copy(plot)
+    pruned.data = plot.data[columns]
+    # ggplot copies share _build_objs, which the last draw filled
+    # with the built layers - the pruned plot has not been built
+    pruned._build_objs = type(plot._build_objs)()
+    if hasattr(pruned, "prune_columns"):
+        del pruned.prune_columns
+    return pruned
+
+
+def _verbatim_columns(plot):
+    """Columns of plot.data that are mapped / faceted on as they are"""
+    exprs = list(plot.mapping.values())
+    for layer in plot.layers:
+        if layer._data is None:
+            exprs.extend(layer.mapping.values())
+    for attr in ("vars", "rows", "cols"):
+        exprs.extend(getattr(plot.facet, attr, None) or [])
+    exprs = {e for e in exprs if isinstance(e, str)}
+    return [c for c in plot.data.columns if c in exprs]
+
+
+@register_verb("categorize_columns", types=p9.ggplot)
+def categorize_columns(plot):
+    """Turn the string columns that aes mappings and facets use verbatim
+    into pandas Categoricals (on a copy of the data).
+
+    plotnine then trains discrete scales and assigns groups from the
+    category codes, instead of hashing every string again per step.
+    Category order is the sorted values - as plotnine would order them.
+    """
+    if not isinstance(plot.data, pd.DataFrame):
+        return plot
+    converted = {}
+    for column in _verbatim_columns(plot):
+        values = plot.data[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            continue
+        if not pd.api.types.is_string_dtype(values):
+            continue
+        try:
+            converted[column] = pd.Categorical(values)
+        except TypeError:  # mixed types - can't sort the categories
+            pass
+    res = copy.copy(plot)
+    if hasattr(res, "categorize_columns"):
+        del res.categorize_columns
+    if converted:
+        res.data = plot.data.assign(**converted)
+        res._build_objs = type(plot._build_objs)()
+    return res
+
+
+@register_verb("load_columns", types=p9.ggplot)
+def load_columns(plot):
+    """Read the columns the plot references from its column_source
+    (see column_files.p9_file).
+
+    Saving does this on its own - call it before handing the plot to
+    plotnine directly. Returns the plot unchanged if it has no column_source.
+    """
+    source = getattr(plot, "column_source", None)
+    if source is None:
+        return plot
+    res = copy.copy(plot)
+    res.data = source.read(referenced_columns(plot))
+    res._build_objs = type(plot._build_objs)()
+    del res.column_source
+    return res
+
+
+def _data_column(plot, column):
+    """plot.data[column], read from the column_source if there is one"""
+    source = getattr(plot, "column_source", None)
+    if source is not None:
+        return source.read([column])[column]
+    return plot.data[column]
+
+
+def _prepared(plot):
+    """plot, pruned / categorized if p9(prune=True, categorize=True) asked for it
+    and with its columns loaded if it was started from a file"""
+    plot = load_columns(plot)
+    if getattr(plot, "prune_columns", False):
+        plot = prune_columns(plot)
+    if getattr(plot, "categorize_columns", False):
+        plot = categorize_columns(plot)
+    return plot
+
+
+def _with_data(plot, df):
+    """A shallow copy of plot with df as its data.
+    Shares layers, scales & theme with plot - only hand it to save,
+    which deep copies those before building"""
+    res = copy.copy(plot)
+    res.data = df
+    res._build_objs = type(plot._build_objs)()
+    if hasattr(res, "column_source"):
+        del res.column_source
+    return res
+
+
+@register_verb("with_data", types=p9.ggplot)
+def with_data(plot, df):
+    """The plot - layers, scales, facets, theme, labels - on df instead.
+
+    Replays a verb chain against new data without re-running it,
+    see batch.PlotTemplate. Layers with their own data= keep it.
+    Verbs that looked at the data while chaining
+    (add_cummulative's percentile title) are not re-evaluated.
+    """
+    return copy.deepcopy(_with_data(plot, df))
 
 
 never_map = set(["data", "stat", "position"])
@@ -39,7 +378,7 @@ def sensible_aes_order(required_aes):
     return order
 
 
-def iter_elements():
+def iter_element_names():
     for name in dir(p9):
         if "_" in name and name[: name.find("_")] in (
             "geom",
@@ -50,24 +389,32 @@ def iter_elements():
             "facet",
             "coord",
         ):
-            cls = getattr(p9, name)
-            yield (name, cls)
-    yield ("theme", p9.theme)
+            yield name
+    yield "theme"
     for name in dir(geoms):
-        cls = getattr(geoms, name)
-        yield (name, cls)
+        yield name
+
+
+def iter_elements():
+    for name in iter_element_names():
+        yield (name, _get_element(name))
 
 
 aliases = {
     "scale_y_continuous": ["syc"],
     "scale_x_continuous": ["sxc"],
 }
+cyberpunks = ["add_point", "add_line", "add_boxplot", "add_bar"]
+
+
+def _get_element(name):
+    if name in geoms.__dict__:
+        return getattr(geoms, name)
+    return getattr(p9, name)
+
 
-for name, cls in iter_elements():  # noqa:C901
-    if name in aliases:
-        register_name = aliases[name] + [name]
-    else:
-        register_name = name
+def _register_element(name, register_name):
+    cls = _get_element(name)
 
     @register_verb(register_name, types=p9.ggplot)
     def add_geom(plot, *args, cls=cls, **kwargs):
@@ -76,81 +423,210 @@ for name, cls in iter_elements():  # noqa:C901
             args[0] = p9.aes(**args[0])
         return plot + cls(*args, **kwargs)
 
-    if name.startswith("geom"):
-        add_name = "add" + name[name.find("_") :]
-        cyberpunks = ["add_point", "add_line", "add_boxplot", "add_bar"]
-        if add_name in cyberpunks:
 
-            @register_verb(add_name, types=p9.ggplot, pass_dppd=True)
-            def add_wrapped_add_geom(dppd, *args, add_name=add_name, **kwargs):
-                if hasattr(dppd.df, "cyberpunked"):
-                    return getattr(dppd, add_name + "_cyberpunk")(*args, **kwargs)
-                else:
-                    return getattr(dppd, "_" + add_name)(*args, **kwargs)
+def _register_cyberpunk_dispatch(add_name):
+    @register_verb(add_name, types=p9.ggplot, pass_dppd=True)
+    def add_wrapped_add_geom(dppd, *args, add_name=add_name, **kwargs):
+        if hasattr(dppd.df, "cyberpunked"):
+            return getattr(dppd, add_name + "_cyberpunk")(*args, **kwargs)
+        else:
+            return getattr(dppd, "_" + add_name)(*args, **kwargs)
 
-            add_name = "_" + add_name
 
-        @register_verb(add_name, types=p9.ggplot)
-        def add_add_geom(plot, *args, cls=cls, **kwargs):
-            if len(args) > len(cls.REQUIRED_AES):
-                raise ValueError(
-                    "More position arguments then required aes were passed in. "
-                    "Switch to keyword arguments to precisly define what you mean"
-                )
-            for k, v in zip(sensible_aes_order(cls.REQUIRED_AES), args):
-                if not k in kwargs and not "_" + k in kwargs:
-                    kwargs[k] = v
-                else:
-                    raise ValueError(
-                        f"{k} specified twice, once per position and once per kwarg"
-                    )
-            mapped = {}
-            non_mapped = {}
-            other = {}
-            for k, v in kwargs.items():
-                if k in other_args:
-                    other[k] = v
-                elif k in never_map:
-                    non_mapped[k] = v
-                elif k.startswith("_"):
-                    non_mapped[k[1:]] = v
-                else:
-                    mapped[k] = v
+downsampled_geoms = {
+    p9.geom_path: geoms.geom_path_downsampled,
+    p9.geom_line: geoms.geom_line_downsampled,
+    p9.geom_step: geoms.geom_step_downsampled,
+}
+glowing_geoms = {
+    p9.geom_point: geoms.geom_point_glow,
+    p9.geom_line: geoms.geom_line_glow,
+    p9.geom_boxplot: geoms.geom_boxplot_glow,
+    p9.geom_bar: geoms.geom_bar_glow,
+    geoms.geom_point_decimated: geoms.geom_point_decimated_glow,
+    geoms.geom_line_downsampled: geoms.geom_line_downsampled_glow,
+}
 
-            if cls is p9.geom_bar and not "stat" in non_mapped:
-                non_mapped["stat"] = p9.stat_identity()
 
-            if "data" in kwargs and kwargs["data"] is None:  # explicitly set to None
-                fake_data = {k: mapped[k] for k in cls.REQUIRED_AES if k in mapped}
-                try:
-                    data = pd.DataFrame(fake_data)
-                except ValueError as e:
-                    if "you must pass an index" in str(e):
-                        data = pd.DataFrame(fake_data, index=[0])
-                    else:
-                        raise
+AddArgSpec = collections.namedtuple("AddArgSpec", ["geom", "positional", "underscored"])
+AddArgSpec.__doc__ = """How an add_* verb resolves its arguments.
+geom: the geom class
+positional: aes names positional args are mapped to, in order
+underscored: '_' + each positional name (the unmapped spelling)"""
+
+
+@functools.cache
+def add_arg_spec(cls):
+    """The (cached) AddArgSpec of the add_* verb for geom class cls"""
+    positional = tuple(sensible_aes_order(cls.REQUIRED_AES))
+    return AddArgSpec(cls, positional, tuple("_" + k for k in positional))
+
+
+@functools.cache
+def _kwarg_kind(key):
+    """(group, name) an add_* kwarg ends up in - mapped, non_mapped or other"""
+    if key in other_args:
+        return "other", key
+    elif key in never_map:
+        return "non_mapped", key
+    elif key.startswith("_"):
+        return "non_mapped", key[1:]
+    return "mapped", key
+
+
+def split_add_args(spec, args, kwargs):
+    """Resolve an add_* call into (mapped, non_mapped, other) kwargs.
+
+    Positional args become the spec's positional aes,
+    kwargs starting with '_' are unmapped (sans '_'),
+    data/stat/position are passed through, DEFAULT_AES is other.
+    kwargs gains the positional args.
+    """
+    if len(args) > len(spec.positional):
+        raise ValueError(
+            "More position arguments then required aes were passed in. "
+            "Switch to keyword arguments to precisly define what you mean"
+        )
+    for k, underscored, v in zip(spec.positional, spec.underscored, args):
+        if k in kwargs or underscored in kwargs:
+            raise ValueError(
+                f"{k} specified twice, once per position and once per kwarg"
+            )
+        kwargs[k] = v
+    groups = {"mapped": {}, "non_mapped": {}, "other": {}}
+    for k, v in kwargs.items():
+        group, name = _kwarg_kind(k)
+        groups[group][name] = v
+    return groups["mapped"], groups["non_mapped"], groups["other"]
+
+
+def _register_add_geom(name, add_name):
+    cls = _get_element(name)
+    spec = add_arg_spec(cls)
+
+    @register_verb(add_name, types=p9.ggplot)
+    def add_add_geom(plot, *args, cls=cls, **kwargs):
+        mapped, non_mapped, other = split_add_args(spec, args, kwargs)
+
+        if cls is p9.geom_bar and not "stat" in non_mapped:
+            non_mapped["stat"] = p9.stat_identity()
+        if cls is p9.geom_point and "max_points" in non_mapped:
+            cls = geoms.geom_point_decimated
+        if cls in downsampled_geoms and "downsample" in non_mapped:
+            cls = downsampled_geoms[cls]
+        if cls in glowing_geoms and "glow" in non_mapped:
+            cls = glowing_geoms[cls]
+
+        if "data" in kwargs and kwargs["data"] is None:  # explicitly set to None
+            fake_data = {k: mapped[k] for k in cls.REQUIRED_AES if k in mapped}
+            try:
+                data = pd.DataFrame(fake_data)
+            except ValueError as e:
+                if "you must pass an index" in str(e):
+                    data = pd.DataFrame(fake_data, index=[0])
+                else:
+                    raise
 
-                mapped = {k: k for k in cls.REQUIRED_AES if k in mapped}
-                non_mapped["data"] = data
+            mapped = {k: k for k in cls.REQUIRED_AES if k in mapped}
+            non_mapped["data"] = data
 
-            geom = cls(p9.aes(**mapped), **non_mapped)
-            if "DEFAULT_AES" in other:
-                geom.DEFAULT_AES = geom.DEFAULT_AES.copy()
-                geom.DEFAULT_AES.update(other["DEFAULT_AES"])
-            return plot + geom
+        geom = cls(p9.aes(**mapped), **non_mapped)
+        if "DEFAULT_AES" in other:
+            geom.DEFAULT_AES = geom.DEFAULT_AES.copy()
+            geom.DEFAULT_AES.update(other["DEFAULT_AES"])
+        return plot + geom
 
-        add_funcs[add_name] = add_add_geom
+    add_add_geom.arg_spec = spec
+    add_funcs[add_name] = add_add_geom
 
 
-@register_verb(["save", "render"], types=p9.ggplot)
-def save(plot, *args, **kwargs):
-    """Save a plot.
-    Arguments are drawn from the kwargs + the plot's .render_args
-    (kwargs overwrite render_args).
+# verb name -> callable that registers it on first lookup.
+# Registering all ~800 element verbs up front dominated our import time,
+# so we only collect the names here and let LazyVerbRegistry do the rest.
+lazy_verbs = {}
+
+# verbs living in modules 'import dppd_plotnine' does not import
+module_verbs = {"save_async": ".batch", "save_facets": ".batch"}
 
-    Optional new kw_arg is size, which may be one of A4/A5/A6,
-    and replaces the width&height (use A4 for portrait, a4 for landscape...)"""
 
+def _collect_lazy_verbs():
+    for name in iter_element_names():
+        for register_name in aliases.get(name, []) + [name]:
+            lazy_verbs[register_name] = functools.partial(
+                _register_element, name, register_name
+            )
+        if name.startswith("geom"):
+            add_name = "add" + name[name.find("_") :]
+            if add_name in cyberpunks:
+                lazy_verbs[add_name] = functools.partial(
+                    _register_cyberpunk_dispatch, add_name
+                )
+                add_name = "_" + add_name
+            lazy_verbs[add_name] = functools.partial(_register_add_geom, name, add_name)
+
+
+class LazyVerbRegistry(dict):
+    """dppd's verb registry, resolving the plotnine element verbs
+    (geom_*, add_*, scale_*, theme_*, ...) the first time they are looked up.
+    """
+
+    def _resolve(self, key):
+        name, typ = key
+        if typ is not p9.ggplot:
+            _resolve_type(typ)
+            return dict.__contains__(self, key)
+        if name in module_verbs:
+            # not under registry_lock - a thread importing the module
+            # holds its import lock while registering the verbs
+            importlib.import_module(module_verbs[name], __package__)
+            return dict.__contains__(self, key)
+        with registry_lock:
+            if name in lazy_verbs:
+                # pop first - register_verb looks the name up again
+                lazy_verbs.pop(name)()
+            return dict.__contains__(self, key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or self._resolve(key)
+
+    def __getitem__(self, key):
+        if not dict.__contains__(self, key):
+            self._resolve(key)
+        return dict.__getitem__(self, key)
+
+    def keys(self):
+        register_all_verbs()
+        return dict.keys(self)
+
+
+def register_all_verbs():
+    """Resolve every pending lazy verb right away (e.g. for dir())"""
+    for module_name in set(module_verbs.values()):
+        importlib.import_module(module_name, __package__)
+    with registry_lock:
+        for name in list(lazy_verbs):
+            # resolving one verb may resolve others on the way
+            func = lazy_verbs.pop(name, None)
+            if func and not dict.__contains__(
+                dppd_base.verb_registry, (name, p9.ggplot)
+            ):
+                func()
+        for module_name in list(lazy_types):
+            if module_name in sys.modules:
+                _register_lazy_type(module_name)
+
+
+_collect_lazy_verbs()
+if not isinstance(dppd_base.verb_registry, LazyVerbRegistry):
+    dppd_base.verb_registry = LazyVerbRegistry(dppd_base.verb_registry)
+if not isinstance(dppd_base.dppd_types, LazyTypeSet):
+    dppd_base.dppd_types = LazyTypeSet(dppd_base.dppd_types)
+
+
+def resolve_save_kwargs(plot, kwargs):
+    """Merge kwargs with the plot's .render_args
+    (kwargs overwrite render_args) and turn size into width&height"""
+    kwargs = kwargs.copy()
     if not "verbose" in kwargs:  # pragma: no cover
         kwargs["verbose"] = False
     else:  # pragma: no cover
@@ -185,11 +661,111 @@ def save(plot, *args, **kwargs):
         kwargs["width"] = width
         kwargs["height"] = height
         # kwargs["unit"] = "in"
+    return kwargs
 
-    plot.save(*args, **kwargs)
+
+def _save_target(args, kwargs):
+    from pathlib import Path
+
+    filename = args[0] if args else kwargs.get("filename")
+    if not isinstance(filename, (str, Path)):
+        raise TypeError("cache=True requires a filename to save to")
+    if kwargs.get("path"):
+        return Path(kwargs["path"]) / filename
+    return Path(filename)
+
+
+# matplotlib's rcParams & pyplot state are global -
+# renders from background threads (save_async) must not interleave
+render_lock = threading.RLock()
+
+
+@register_verb(["save", "render"], types=p9.ggplot)
+def save(plot, *args, **kwargs):
+    """Save a plot.
+    Arguments are drawn from the kwargs + the plot's .render_args
+    (kwargs overwrite render_args).
+
+    Optional new kw_arg is size, which may be one of A4/A5/A6,
+    and replaces the width&height (use A4 for portrait, a4 for landscape...)
+
+    Plots started with p9(prune=True) are rendered from only the
+    columns they reference, p9(categorize=True) ones with their mapped
+    string columns as Categoricals.
+
+    Optional new kw_arg cache=True fingerprints data, layers, scales, theme
+    and save arguments, stores the fingerprint next to the output
+    (filename + '.fingerprint') and skips rendering if it is unchanged.
+
+    Optional new kw_arg profile=True times the render per phase
+    (build, drawing layers, breaks & labels, encoding...) and per layer
+    step (aesthetics, stat, position, scales, draw), stores that on
+    plot.render_timings and logs it to the 'dppd_plotnine.profiling' logger
+    (the dict is the record's render_timings attribute).
+
+    Optional new kw_arg reuse_figure=True draws into a figure outside of
+    pyplot, on a canvas whose pixel buffer is pooled by size and reused
+    by the next save of the same size and dpi (see figure_pool) -
+    for saving many same sized plots. Needs plotnine >= 0.15,
+    it's a plain save otherwise.
+    """
+    kwargs = resolve_save_kwargs(plot, kwargs)
+    cache = kwargs.pop("cache", False)
+    profile = kwargs.pop("profile", False)
+    reuse_figure = kwargs.pop("reuse_figure", False)
+    rendered = _prepared(plot)
+    if cache:
+        from .fingerprint import fingerprint_plot
+
+        target = _save_target(args, kwargs)
+        sidecar = target.with_name(target.name + ".fingerprint")
+        fingerprint = fingerprint_plot(
+            rendered, *args, **{k: v for k, v in kwargs.items() if k != "verbose"}
+        )
+        if (
+            fingerprint is not None
+            and target.exists()
+            and sidecar.exists()
+            and sidecar.read_text() == fingerprint
+        ):
+            return plot
+        if sidecar.exists():
+            sidecar.unlink()
+
+    with render_lock:
+        if profile:
+            from .profiling import profiled_save
+
+            plot.render_timings = profiled_save(rendered, *args, **kwargs)
+        elif reuse_figure:
+            from .figure_pool import pooled_save
+
+            pooled_save(rendered, *args, **kwargs)
+        else:
+            rendered.save(*args, **kwargs)
+    if cache and fingerprint is not None:
+        sidecar.write_text(fingerprint)
     return plot
 
 
+@register_verb("render_bytes", types=p9.ggplot)
+def render_bytes(plot, format="png", buffer=None, **kwargs):
+    """The plot encoded as format ('png', 'svg', 'pdf', ...),
+    without going through the file system.
+
+    Takes save's kwargs (size, dpi, reuse_figure, profile...)
+    merged with the plot's .render_args - a render_args cache=True is ignored.
+
+    Returns bytes - or, if a writable binary buffer (e.g. a response stream)
+    is passed, writes into that and returns it.
+    """
+    if kwargs.get("cache"):
+        raise ValueError("render_bytes can't cache, there is no file to compare")
+    target = io.BytesIO() if buffer is None else buffer
+    save(plot, target, format=format, **{**kwargs, "cache": False})
+    return target.getvalue() if buffer is None else buffer
+
+
 @register_verb("add_scatter", types=p9.ggplot, pass_dppd=True)
 def add_scatter(dppd, *args, **kwargs):
     return dppd.add_point(*args, **kwargs)
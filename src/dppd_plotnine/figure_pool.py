@@ -0,0 +1,120 @@
+import collections
+import copy
+import threading
+
+import plotnine as p9
+from matplotlib.backends.backend_agg import FigureCanvasAgg, RendererAgg
+from matplotlib.figure import Figure
+
+# reusing matplotlib canvases across saves - see save(..., reuse_figure=True)
+#
+# Every save draws into a fresh Figure that is not registered with pyplot,
+# on a canvas whose Agg renderer (the pixel buffer) comes from a pool of
+# buffers by size. Artists, axes and theming never outlive a save -
+# clearing a drawn figure for reuse costs more than making a new one.
+#
+# This overrides ggplot's private figure creation, as of plotnine 0.15.
+# On other versions reuse_figure=True is a plain save.
+
+try:
+    from plotnine._mpl.gridspec import p9GridSpec
+    from plotnine._utils.context import plot_context
+except ImportError:
+    pooling = False
+else:
+    pooling = tuple(int(x) for x in p9.__version__.split(".")[:2]) >= (0, 15)
+
+
+class RendererPool:
+    """Idle Agg renderers by (width, height, dpi).
+
+    max_idle renderers are kept, the least recently used size goes first.
+    """
+
+    def __init__(self, max_idle=4):
+        self.max_idle = max_idle
+        self.created = 0
+        self.reused = 0
+        self._idle = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        with self._lock:
+            renderers = self._idle.get(key)
+            if renderers:
+                self.reused += 1
+                renderer = renderers.pop()
+                if not renderers:
+                    del self._idle[key]
+                return renderer
+            self.created += 1
+        return RendererAgg(*key)
+
+    def release(self, key, renderer):
+        with self._lock:
+            self._idle.setdefault(key, []).append(renderer)
+            self._idle.move_to_end(key)
+            while sum(len(x) for x in self._idle.values()) > self.max_idle:
+                oldest = next(iter(self._idle))
+                self._idle[oldest].pop(0)
+                if not self._idle[oldest]:
+                    del self._idle[oldest]
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
+
+
+renderer_pool = RendererPool()
+
+
+class PooledCanvas(FigureCanvasAgg):
+    """An Agg canvas taking its renderer from renderer_pool.
+    The renderer is cleared before every draw (FigureCanvasAgg.draw)."""
+
+    def get_renderer(self):
+        w, h = self.figure.bbox.size
+        key = (w, h, self.figure.dpi)
+        if self._lastKey != key:
+            self.release()
+            self.renderer = renderer_pool.acquire(key)
+            self._lastKey = key
+        return self.renderer
+
+    def release(self):
+        """Hand the renderer back to the pool"""
+        if self._lastKey is not None:
+            renderer_pool.release(self._lastKey, self.renderer)
+            del self.renderer
+            self._lastKey = None
+
+
+class pooled_ggplot(p9.ggplot):
+    """A ggplot drawing on a PooledCanvas"""
+
+    def _create_figure(self):
+        self.figure = Figure()
+        PooledCanvas(self.figure)
+        self._gridspec = p9GridSpec(1, 1, self.figure)
+
+    def save(self, *args, **kwargs):
+        # ggplot.save, handing the renderer back afterwards
+        sv = self.save_helper(*args, **kwargs)
+        try:
+            with plot_context(self).rc_context:
+                sv.figure.savefig(**sv.kwargs)
+        finally:
+            sv.figure.canvas.release()
+
+
+def pooled_save(plot, *args, **kwargs):
+    """plot.save(*args, **kwargs), reusing a pixel buffer of the same size.
+
+    Must be called with render_lock held.
+    """
+    if not pooling:
+        plot.save(*args, **kwargs)
+        return
+    pooled = copy.copy(plot)
+    pooled.__class__ = pooled_ggplot
+    pooled.save(*args, **kwargs)
@@ -0,0 +1,239 @@
+import functools
+import hashlib
+import sysconfig
+import types
+
+import numpy as np
+import pandas as pd
+
+# content fingerprints of plots - for skipping renders that would not change
+
+# these ggplot attributes define what the plot looks like.
+# (environment, layout and _build_objs are either unhashable or derived)
+plot_attributes = [
+    "data",
+    "mapping",
+    "facet",
+    "labels",
+    "layers",
+    "guides",
+    "scales",
+    "theme",
+    "coordinates",
+    "watermarks",
+]
+
+_buffer_kinds = set("biufcmM")
+
+# the caller's namespaces (e.g. facet.environment) - not what the plot
+# looks like, and they differ between processes
+_skipped_attributes = {"environment"}
+
+
+# installed code only changes with its package version - the globals
+# library functions read are not followed
+_library_paths = tuple(
+    sorted({sysconfig.get_paths()[key] for key in ("stdlib", "purelib", "platlib")})
+)
+
+
+class _NoStableState(Exception):
+    """An object whose state can't be told without its memory address"""
+
+
+def _update_array(h, values):
+    if isinstance(values, pd.Categorical):
+        _update_array(h, values.codes)
+        _update_array(h, np.asarray(values.categories))
+        return
+    values = np.asarray(values)
+    h.update(str(values.dtype).encode("utf-8"))
+    if values.dtype.kind in _buffer_kinds:
+        # hash the raw column buffer - no per-row python work
+        h.update(np.ascontiguousarray(values).view(np.uint8).data)
+    else:
+        try:
+            hashed = pd.util.hash_pandas_object(pd.Series(values), index=False)
+        except (TypeError, ValueError) as e:  # e.g. lists or dicts in a column
+            raise _NoStableState(values.dtype) from e
+        h.update(hashed.to_numpy().data)
+
+
+def _update_dataframe(h, df):
+    h.update(b"DataFrame")
+    h.update(repr(list(df.columns)).encode("utf-8"))
+    h.update(repr(list(df.shape)).encode("utf-8"))
+    if isinstance(df.index, pd.RangeIndex):
+        h.update(repr(df.index).encode("utf-8"))
+    else:
+        _update_array(h, df.index.array)
+    for i in range(df.shape[1]):
+        _update_array(h, df.iloc[:, i].array)
+
+
+def fingerprint_dataframe(df):
+    """A hex digest identifying the content of a DataFrame.
+
+    Numeric and datetime columns are hashed straight from their buffers,
+    everything else via pandas' vectorized hash_pandas_object.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    _update_dataframe(h, df)
+    return h.hexdigest()
+
+
+def _update(h, obj, seen):
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        h.update(type(obj).__name__.encode("utf-8"))
+        h.update(repr(obj).encode("utf-8"))
+        return
+    if isinstance(obj, pd.DataFrame):
+        _update_dataframe(h, obj)
+        return
+    if isinstance(obj, (pd.Series, pd.Index)):
+        _update_array(h, obj.array)
+        return
+    if isinstance(obj, (np.ndarray, np.generic)):
+        _update_array(h, np.asarray(obj))
+        return
+    if isinstance(obj, type):
+        h.update(f"class:{obj.__module__}.{obj.__qualname__}".encode())
+        return
+    if isinstance(obj, types.ModuleType):
+        h.update(f"module:{obj.__name__}".encode())
+        return
+    if id(obj) in seen:
+        h.update(b"<cycle>")
+        return
+    seen = seen | {id(obj)}
+    if isinstance(obj, (types.FunctionType, types.MethodType)):
+        func = getattr(obj, "__func__", obj)
+        h.update(f"func:{func.__module__}.{func.__qualname__}".encode())
+        names = set()
+        _update_code(h, func.__code__, names)
+        _update(h, func.__defaults__, seen)
+        _update(h, func.__kwdefaults__, seen)
+        for cell in func.__closure__ or ():
+            try:
+                _update(h, cell.cell_contents, seen)
+            except ValueError:  # empty cell
+                pass
+        # the globals user code reads - attribute names are in co_names
+        # as well, those are simply not found
+        if func.__code__.co_filename.startswith(_library_paths):
+            names = ()
+        for name in sorted(names):
+            if name in func.__globals__:
+                h.update(name.encode("utf-8"))
+                _update(h, func.__globals__[name], seen)
+        if isinstance(obj, types.MethodType):
+            _update(h, obj.__self__, seen)
+        return
+    if callable(obj) and not hasattr(obj, "__dict__"):  # builtins, ufuncs
+        name = getattr(obj, "__qualname__", None) or getattr(obj, "__name__", None)
+        if name is not None:
+            h.update(f"builtin:{getattr(obj, '__module__', None)}.{name}".encode())
+            bound_to = getattr(obj, "__self__", None)
+            if not isinstance(bound_to, types.ModuleType):
+                _update(h, bound_to, seen)
+            return
+    h.update(f"{type(obj).__module__}.{type(obj).__qualname__}".encode())
+    if isinstance(obj, dict):
+        for key in sorted(obj, key=repr):
+            _update(h, key, seen)
+            _update(h, obj[key], seen)
+    elif isinstance(obj, (list, tuple)):
+        h.update(str(len(obj)).encode("utf-8"))
+        for value in obj:
+            _update(h, value, seen)
+    elif isinstance(obj, (set, frozenset)):
+        for value in sorted(obj, key=repr):
+            _update(h, value, seen)
+    if hasattr(obj, "__dict__"):
+        # cached_properties get filled in by rendering, they are not state
+        klass = type(obj)
+        state = {
+            key: value
+            for key, value in vars(obj).items()
+            if key not in _skipped_attributes
+            and not isinstance(getattr(klass, key, None), functools.cached_property)
+        }
+        _update(h, state, seen)
+    elif not isinstance(obj, (dict, list, tuple, set, frozenset)):
+        # no __dict__ - its pickle state, reprs may carry addresses
+        try:
+            reduced = obj.__reduce_ex__(4)
+        except TypeError as e:
+            raise _NoStableState(type(obj)) from e
+        if isinstance(reduced, str):  # a global, by name
+            h.update(reduced.encode("utf-8"))
+        else:
+            _update(h, reduced[1:], seen)
+
+
+def _update_code(h, code, names):
+    """Bytecode, constants and names of code and the code nested in it
+    (lambdas, comprehensions) - collecting the names it reads into names"""
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode("utf-8"))
+    names.update(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _update_code(h, const, names)
+        else:
+            _update(h, const, frozenset())
+
+
+def _update_environment(h, plot):
+    """The values aes / facet expressions read from the plot's environment
+    - e.g. factor in aes(y='hp * factor'). Names that are not found
+    there (columns, after_stat variables) are left to the data."""
+    from .dppd_plotnine import _expression_names
+
+    environment = getattr(plot, "environment", None)
+    if environment is None:
+        return
+    exprs = list(plot.mapping.values())
+    for layer in plot.layers:
+        exprs.extend(layer.mapping.values())
+    for attr in ("vars", "rows", "cols"):
+        exprs.extend(getattr(plot.facet, attr, None) or [])
+    for name in sorted(_expression_names(exprs)):
+        if not name.isidentifier():  # a whole expression
+            continue
+        try:
+            value = environment.eval(name)
+        except NameError:
+            continue
+        h.update(name.encode("utf-8"))
+        _update(h, value, frozenset())
+
+
+def fingerprint_plot(plot, *args, **save_kwargs):
+    """A hex digest identifying a plot and the arguments it's saved with.
+
+    Covers data, layers, scales, theme, facets, coordinates and labels,
+    and the variables and functions aes expressions use from the
+    plot's environment. Functions (there and e.g. in scale labels) count
+    by their code, constants and the module globals they read.
+
+    The same plot has the same fingerprint in every process.
+    None if the plot contains an object whose state can't be told
+    (it is then rendered every time).
+    """
+    import plotnine
+
+    h = hashlib.blake2b(digest_size=20)
+    _update(h, plotnine.__version__, frozenset())
+    try:
+        for attr in plot_attributes:
+            h.update(attr.encode("utf-8"))
+            _update(h, getattr(plot, attr, None), frozenset())
+        h.update(b"environment")
+        _update_environment(h, plot)
+        h.update(b"save")
+        _update(h, args, frozenset())
+        _update(h, save_kwargs, frozenset())
+    except _NoStableState:
+        return None
+    return h.hexdigest()
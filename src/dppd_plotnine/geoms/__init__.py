@@ -1 +1,16 @@
 from .annotation_stripes_dppd import annotation_stripes_dppd  # noqa:F401
+from .geom_bin2d_fast import geom_bin2d_fast, geom_hexbin  # noqa:F401
+from .geom_path_downsampled import (  # noqa:F401
+    geom_line_downsampled,
+    geom_path_downsampled,
+    geom_step_downsampled,
+)
+from .geom_point_decimated import geom_point_decimated  # noqa:F401
+from .geom_point_glow import (  # noqa:F401
+    geom_bar_glow,
+    geom_boxplot_glow,
+    geom_line_downsampled_glow,
+    geom_line_glow,
+    geom_point_decimated_glow,
+    geom_point_glow,
+)
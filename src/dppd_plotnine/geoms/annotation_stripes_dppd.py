@@ -1,15 +1,22 @@
-import pandas as pd
-import numpy as np
+import functools
 
+import numpy as np
 from plotnine.coords import coord_flip
+from plotnine.coords.coord_cartesian import coord_cartesian
 
 try:
-    from plotnine.scales.scale import scale_discrete
+    from plotnine.scales.scale_discrete import scale_discrete
 except ImportError:
-    from plotnine.scales import scale_discrete
-from plotnine.geoms.geom import geom
-from plotnine.geoms.geom_rect import geom_rect
+    try:
+        from plotnine.scales.scale import scale_discrete
+    except ImportError:
+        from plotnine.scales import scale_discrete
+try:
+    from plotnine._utils import SIZE_FACTOR
+except ImportError:
+    from plotnine.utils import SIZE_FACTOR
 from plotnine.geoms.annotate import annotate
+from plotnine.geoms.geom import geom
 
 
 class annotation_stripes_dppd(annotate):
@@ -47,6 +54,62 @@ class annotation_stripes_dppd(annotate):
         self._annotation_geom = _geom_stripes(**kwargs)
 
 
+def _axis(panel_params, axis, data_axis):
+    """(discrete?, breaks, number of labels, range) of a panel's
+    x or y axis (as drawn - coord_flip swaps them)"""
+    try:
+        view = getattr(panel_params, axis)
+    except AttributeError:  # plotnine < 0.7 - panel_params is a dict
+        scale = getattr(panel_params["scales"], data_axis)
+        return (
+            isinstance(scale, scale_discrete),
+            tuple(panel_params[axis + "_major"]),
+            len(panel_params[axis + "_labels"]),
+            tuple(panel_params[axis + "_range"]),
+        )
+    return (
+        isinstance(view.scale, scale_discrete),
+        tuple(view.breaks),
+        len(view.labels),
+        tuple(view.range),
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def stripe_vertices(along, discrete, breaks, count, span, across, extend):
+    """Rectangles (n, 4, 2) centered on each break of the along axis
+    ('x' or 'y'), covering extend (relative) of the across range.
+
+    Cached - every panel with the same breaks and ranges
+    (i.e. all panels of fixed scale facets) shares one array.
+    """
+    if discrete:
+        left = np.arange(count, dtype=float) + 0.5
+        step = 1.0
+    else:
+        major = np.asarray(breaks, dtype=float)
+        if count > 1:
+            step = (major[-1] - major[0]) / (count - 1)
+        else:
+            step = span[1] - span[0]
+        left = major - step / 2
+    right = left + step
+    if len(left):
+        left[0] = span[0]
+        right[-1] = span[1]
+    low = across[0] + extend[0] * (across[1] - across[0])
+    high = across[0] + extend[1] * (across[1] - across[0])
+    verts = np.empty((len(left), 4, 2))
+    verts[:, 0, 0] = verts[:, 1, 0] = left
+    verts[:, 2, 0] = verts[:, 3, 0] = right
+    verts[:, 0, 1] = verts[:, 3, 1] = low
+    verts[:, 1, 1] = verts[:, 2, 1] = high
+    if along == "y":
+        verts = verts[:, :, ::-1]
+    verts.flags.writeable = False
+    return verts
+
+
 class _geom_stripes(geom):
     DEFAULT_AES = {}
     REQUIRED_AES = set()
@@ -64,57 +127,41 @@ class _geom_stripes(geom):
     }
     legend_geom = "polygon"
 
-    @staticmethod
-    def draw_group(data, panel_params, coord, ax, **params):
-        is_coord_flip = isinstance(coord, coord_flip)
-        direction = params["direction"]
-        if direction == "vertical":
-            scale = getattr(panel_params["scales"], "x")
-            if is_coord_flip:
-                prefix, other_prefix = "y_", "x_"
-            else:
-                prefix, other_prefix = "x_", "y_"
-        else:
-            scale = getattr(panel_params["scales"], "y")
-            if is_coord_flip:
-                prefix, other_prefix = "x_", "y_"
-            else:
-                prefix, other_prefix = "y_", "x_"
+    def draw_panel(self, data, panel_params, coord, ax, **params):
+        # one PolyCollection per panel, straight from numpy
+        from matplotlib.collections import PolyCollection
+        from matplotlib.colors import to_rgba_array
 
-        is_scale_discrete = isinstance(scale, scale_discrete)
-        fill = list(params["fill"])
-        count = len(panel_params[prefix + "labels"])
-        if is_scale_discrete:
-            step_size = 1
-            left = np.arange(0, count, 1) + 0.5
-        else:
-            step_size = (
-                panel_params[prefix + "major"][-1] - panel_params[prefix + "major"][0]
-            ) / (count - 1)
-            left = panel_params[prefix + "major"] - step_size / 2
-        right = left + step_size
-        left[0] = panel_params[prefix + "range"][0]
-        right[-1] = panel_params[prefix + "range"][1]
-        ymin = panel_params[other_prefix + "range"][0]
-        y_extend = (
-            panel_params[other_prefix + "range"][1]
-            - panel_params[other_prefix + "range"][0]
+        params = params or self.params
+        if not isinstance(coord, coord_cartesian):
+            raise TypeError("annotation_stripes_dppd needs a cartesian coord")
+        vertical = params["direction"] == "vertical"
+        flipped = isinstance(coord, coord_flip)
+        along = "x" if vertical != flipped else "y"
+        across = "y" if along == "x" else "x"
+        discrete, breaks, count, span = _axis(
+            panel_params, along, "x" if vertical else "y"
         )
-        data = pd.DataFrame(
-            {
-                "xmin": left,
-                "xmax": right,
-                "ymin": ymin + params["extend"][0] * y_extend,
-                "ymax": ymin + params["extend"][1] * y_extend,
-                "fill": (fill * len(left))[: len(left)],
-                "size": params["size"],
-                "linetype": params["linetype"],
-                "alpha": params["alpha"],
-                "color": "#000000",
-            }
+        across_range = _axis(panel_params, across, "y" if vertical else "x")[3]
+        verts = stripe_vertices(
+            along,
+            discrete,
+            breaks,
+            count,
+            span,
+            across_range,
+            tuple(params["extend"]),
         )
-        if direction == "horizontal":
-            data = data.rename(
-                columns={"xmin": "ymin", "xmax": "ymax", "ymin": "xmin", "ymax": "xmax"}
+        fill = list(params["fill"])
+        colors = (fill * len(verts))[: len(verts)]
+        ax.add_collection(
+            PolyCollection(
+                verts,
+                facecolors=to_rgba_array(colors, params["alpha"]),
+                edgecolors="#000000",
+                linestyles=params["linetype"],
+                linewidths=params["size"] * SIZE_FACTOR,
+                zorder=params["zorder"],
+                rasterized=params.get("raster", False),
             )
-        return geom_rect.draw_group(data, panel_params, coord, ax, **params)
+        )
@@ -0,0 +1,288 @@
+from typing import ClassVar
+
+import numpy as np
+import pandas as pd
+from plotnine import after_stat
+from plotnine._utils import SIZE_FACTOR, to_rgba
+from plotnine.geoms.geom import geom
+from plotnine.geoms.geom_polygon import geom_polygon
+from plotnine.stats.stat import stat
+
+from ..shared import stat_method
+
+# corners of a unit hexagon, scaled by (x step, y step / 3) - as in matplotlib's hexbin
+hexagon = np.array(
+    [[0.5, -0.5], [0.5, 0.5], [0.0, 1.0], [-0.5, 0.5], [-0.5, -0.5], [0.0, -1.0]]
+)
+
+
+def _bins(bins):
+    if isinstance(bins, (tuple, list)):
+        return int(bins[0]), int(bins[1])
+    return int(bins), int(bins)
+
+
+def _dimension(scale):
+    low, high = scale.dimension()
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return low, high
+
+
+def rect_bins(x, y, weight, bins, range_x, range_y):
+    """Counts on a bins x bins grid, via one np.bincount.
+
+    Returns (counts, x centers, y centers, x step, y step),
+    counts being flat over all cells.
+    """
+    nx, ny = bins
+    sx = (range_x[1] - range_x[0]) / nx
+    sy = (range_y[1] - range_y[0]) / ny
+    ix = np.clip(np.floor((x - range_x[0]) / sx), 0, nx - 1).astype(np.int64)
+    iy = np.clip(np.floor((y - range_y[0]) / sy), 0, ny - 1).astype(np.int64)
+    counts = np.bincount(ix * ny + iy, weights=weight, minlength=nx * ny)
+    cx, cy = np.divmod(np.arange(nx * ny), ny)
+    return counts, range_x[0] + (cx + 0.5) * sx, range_y[0] + (cy + 0.5) * sy, sx, sy
+
+
+def hex_bins(x, y, weight, bins, range_x, range_y):
+    """Counts on two interleaved lattices forming a hexagonal grid,
+    via one np.bincount (the same tesselation matplotlib's hexbin uses).
+
+    Returns (counts, x centers, y centers, x step, y step).
+    """
+    nx, ny = bins
+    sx = (range_x[1] - range_x[0]) / nx
+    sy = (range_y[1] - range_y[0]) / ny
+    xn = (x - range_x[0]) / sx
+    yn = (y - range_y[0]) / sy
+    ix1 = np.clip(np.round(xn), 0, nx).astype(np.int64)
+    iy1 = np.clip(np.round(yn), 0, ny).astype(np.int64)
+    ix2 = np.clip(np.floor(xn), 0, nx - 1).astype(np.int64)
+    iy2 = np.clip(np.floor(yn), 0, ny - 1).astype(np.int64)
+    d1 = (xn - ix1) ** 2 + 3.0 * (yn - iy1) ** 2
+    d2 = (xn - ix2 - 0.5) ** 2 + 3.0 * (yn - iy2 - 0.5) ** 2
+    n1 = (nx + 1) * (ny + 1)
+    n2 = nx * ny
+    flat = np.where(d1 < d2, ix1 * (ny + 1) + iy1, n1 + ix2 * ny + iy2)
+    counts = np.bincount(flat, weights=weight, minlength=n1 + n2)
+    cx1, cy1 = np.divmod(np.arange(n1), ny + 1)
+    cx2, cy2 = np.divmod(np.arange(n2), ny)
+    cx = np.concatenate([cx1, cx2 + 0.5])
+    cy = np.concatenate([cy1, cy2 + 0.5])
+    return counts, range_x[0] + cx * sx, range_y[0] + cy * sy, sx, sy
+
+
+class stat_bin2d_fast(stat):
+    """
+    2 Dimensional bin counts, vectorized.
+
+    Bins all points of a panel at once over the trained x/y scales
+    (so all facets share one grid), groups are not kept apart.
+
+    {usage}
+
+    Parameters
+    ----------
+    {common_parameters}
+    bins : int or (int, int), default=30
+        Number of bins in x and y
+    drop : bool, default=True
+        If `True`, removes all cells with zero counts.
+    """
+
+    REQUIRED_AES: ClassVar[set] = {"x", "y"}
+    DEFAULT_PARAMS: ClassVar[dict] = {
+        "geom": "bin2d_fast",
+        "position": "identity",
+        "na_rm": False,
+        "bins": 30,
+        "drop": True,
+    }
+    DEFAULT_AES: ClassVar[dict] = {"fill": after_stat("count"), "weight": None}
+    CREATES: ClassVar[set] = {"xmin", "xmax", "ymin", "ymax", "count", "density"}
+    binner = staticmethod(rect_bins)
+    # half the size of a bin, in steps
+    extent = (0.5, 0.5)
+
+    @stat_method
+    def compute_panel(self, data, scales, **params):
+        params = params or self.params
+        if not len(data):
+            return type(data)()
+        weight = data["weight"].to_numpy() if "weight" in data else None
+        counts, x, y, sx, sy = self.binner(
+            data["x"].to_numpy(dtype=float),
+            data["y"].to_numpy(dtype=float),
+            weight,
+            _bins(params["bins"]),
+            _dimension(scales.x),
+            _dimension(scales.y),
+        )
+        if params["drop"]:
+            keep = counts > 0
+            counts, x, y = counts[keep], x[keep], y[keep]
+        dx = self.extent[0] * sx
+        dy = self.extent[1] * sy
+        return pd.DataFrame(
+            {
+                "x": x,
+                "y": y,
+                "xmin": x - dx,
+                "xmax": x + dx,
+                "ymin": y - dy,
+                "ymax": y + dy,
+                "count": counts,
+                "density": counts / counts.sum(),
+                "PANEL": data["PANEL"].iloc[0],
+                "group": -1,
+            }
+        )
+
+
+class stat_hexbin_fast(stat_bin2d_fast):
+    """
+    2 Dimensional bin counts on a hexagonal grid, vectorized.
+
+    {usage}
+
+    Parameters
+    ----------
+    {common_parameters}
+    bins : int or (int, int), default=30
+        Number of hexagons in x and y
+    drop : bool, default=True
+        If `True`, removes all cells with zero counts.
+    """
+
+    DEFAULT_PARAMS: ClassVar[dict] = {
+        **stat_bin2d_fast.DEFAULT_PARAMS,
+        "geom": "hexbin",
+    }
+    binner = staticmethod(hex_bins)
+    extent = (0.5, 1 / 3)
+
+
+class geom_bin2d_fast(geom):
+    """
+    Heatmap of 2d bin counts - for when there are far too many points.
+
+    Binning uses one np.bincount over all points of a panel,
+    and each panel is drawn as a single PolyCollection.
+    Works with facets (all panels share one grid).
+    For a log-scaled fill, add .scale_fill_continuous(trans='log10').
+
+    {usage}
+    plot += geom_bin2d_fast(aes('x', 'y'), bins=100)
+
+    Parameters
+    ----------
+    {common_parameters}
+    bins : int or (int, int), default=30
+        Number of bins in x and y
+    """
+
+    DEFAULT_AES: ClassVar[dict] = {
+        "alpha": 1,
+        "color": None,
+        "fill": "#333333",
+        "linetype": "solid",
+        "size": 0.1,
+    }
+    REQUIRED_AES: ClassVar[set] = {"x", "y"}
+    DEFAULT_PARAMS: ClassVar[dict] = {
+        "stat": "bin2d_fast",
+        "position": "identity",
+        "na_rm": False,
+    }
+    draw_legend = staticmethod(geom_polygon.draw_legend)
+    legend_key_size = staticmethod(geom_polygon.legend_key_size)
+
+    @staticmethod
+    def cell_vertices(data):
+        """(n, corners, 2) array of the bin polygons"""
+        xmin = data["xmin"].to_numpy()[:, None]
+        xmax = data["xmax"].to_numpy()[:, None]
+        ymin = data["ymin"].to_numpy()[:, None]
+        ymax = data["ymax"].to_numpy()[:, None]
+        return np.stack(
+            [
+                np.hstack([xmin, xmax, xmax, xmin]),
+                np.hstack([ymin, ymin, ymax, ymax]),
+            ],
+            axis=-1,
+        )
+
+    def draw_panel(self, data, panel_params, coord, ax, **params):
+        from matplotlib.collections import PolyCollection
+
+        # plotnine < 0.15 hands the params in, later versions use self.params
+        params = params or self.params
+        if not len(data):
+            return
+        verts = self.cell_vertices(data)
+        n, corners, _ = verts.shape
+        # let the coord place the corners - handles coord_flip & coord_trans
+        corner_data = coord.transform(
+            pd.DataFrame({"x": verts[..., 0].ravel(), "y": verts[..., 1].ravel()}),
+            panel_params,
+        )
+        verts = np.stack(
+            [
+                corner_data["x"].to_numpy().reshape(n, corners),
+                corner_data["y"].to_numpy().reshape(n, corners),
+            ],
+            axis=-1,
+        )
+        fill = to_rgba(data["fill"], data["alpha"])
+        color = data["color"].iloc[0]
+        col = PolyCollection(
+            verts,
+            facecolors=fill,
+            edgecolors="none" if color is None else color,
+            linewidths=data["size"].iloc[0] * SIZE_FACTOR if color else 0,
+            linestyles=data["linetype"].iloc[0],
+            zorder=params["zorder"],
+            rasterized=params["raster"],
+        )
+        ax.add_collection(col)
+
+
+class geom_hexbin(geom_bin2d_fast):
+    """
+    Hexagonal heatmap of 2d bin counts - for when there are far too many points.
+
+    Binning uses one np.bincount over all points of a panel,
+    and each panel is drawn as a single PolyCollection.
+    Works with facets (all panels share one grid).
+    For a log-scaled fill, add .scale_fill_continuous(trans='log10').
+
+    {usage}
+    plot += geom_hexbin(aes('x', 'y'), bins=50)
+
+    Parameters
+    ----------
+    {common_parameters}
+    bins : int or (int, int), default=30
+        Number of hexagons in x and y
+    """
+
+    DEFAULT_PARAMS: ClassVar[dict] = {
+        **geom_bin2d_fast.DEFAULT_PARAMS,
+        "stat": "hexbin_fast",
+    }
+
+    @staticmethod
+    def cell_vertices(data):
+        x = data["x"].to_numpy()
+        y = data["y"].to_numpy()
+        # xmax - xmin is one x step, ymax - ymin 2/3 of a y step
+        sx = (data["xmax"] - data["xmin"]).to_numpy()
+        sy = (data["ymax"] - data["ymin"]).to_numpy() * 1.5
+        return np.stack(
+            [
+                x[:, None] + sx[:, None] * hexagon[:, 0],
+                y[:, None] + sy[:, None] / 3 * hexagon[:, 1],
+            ],
+            axis=-1,
+        )
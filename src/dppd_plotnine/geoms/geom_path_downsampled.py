@@ -0,0 +1,220 @@
+from typing import ClassVar
+from warnings import warn
+
+import numpy as np
+from plotnine.coords.coord_cartesian import coord_cartesian
+from plotnine.exceptions import PlotnineWarning
+from plotnine.geoms.geom_line import geom_line
+from plotnine.geoms.geom_path import geom_path
+from plotnine.geoms.geom_step import geom_step
+
+downsample_methods = ("minmax", "lttb")
+
+
+def _run_starts(key):
+    """Start positions of the runs of equal values in key"""
+    return np.concatenate([[0], np.flatnonzero(key[1:] != key[:-1]) + 1])
+
+
+def minmax_indices(starts, y):
+    """Per bucket: the first, last, lowest and highest row.
+
+    Buckets are consecutive rows, starts are their first positions.
+    Returns sorted positions.
+    """
+    ends = np.append(starts[1:], len(y))
+    run = np.repeat(np.arange(len(starts)), ends - starts)
+    finite = np.isfinite(y)
+    keep = [starts, ends - 1, np.flatnonzero(~finite)]
+    if finite.any():
+        lowest = np.fmin.reduceat(y, starts)
+        highest = np.fmax.reduceat(y, starts)
+        for extreme in lowest, highest:
+            hits = np.flatnonzero(y == extreme[run])
+            # first hit per run
+            _, first = np.unique(run[hits], return_index=True)
+            keep.append(hits[first])
+    return np.unique(np.concatenate(keep))
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: n_out positions out of len(x).
+
+    Keeps first and last point, and per equally sized bucket in between
+    the point spanning the largest triangle with the previously chosen
+    point and the mean of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    chosen = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[hi:next_hi].mean()
+        next_y = y[hi:next_hi].mean()
+        area = np.abs(
+            (x[chosen] - next_x) * (y[lo:hi] - y[chosen])
+            - (x[chosen] - x[lo:hi]) * (next_y - y[chosen])
+        )
+        chosen = lo + int(np.nanargmax(area)) if np.isfinite(area).any() else lo
+        keep[i + 1] = chosen
+    return keep
+
+
+def _lttb_runs(x, y, n_out):
+    """lttb_indices per run of finite points, sharing n_out by run length.
+    The non finite rows between them (line breaks) are kept,
+    so no triangle spans a break."""
+    bad = ~(np.isfinite(x) & np.isfinite(y))
+    if not bad.any():
+        return lttb_indices(x, y, n_out)
+    edges = np.diff(np.concatenate([[True], bad, [True]]).astype(np.int8))
+    keep = [np.flatnonzero(bad)]
+    for start, stop in zip(np.flatnonzero(edges == -1), np.flatnonzero(edges == 1)):
+        share = max(3, round(n_out * (stop - start) / len(x)))
+        keep.append(start + lttb_indices(x[start:stop], y[start:stop], share))
+    return np.sort(np.concatenate(keep))
+
+
+def downsample_lines(data, pixels, method="minmax", x_range=None):
+    """Reduce each group of a path to what is visible at pixels resolution.
+
+    minmax: per group and pixel column (x_range split into pixels
+        columns, x sorted) keep first, last, lowest and highest point
+        - at most 4 points per pixel column
+    lttb: per group Largest-Triangle-Three-Buckets down to 2 * pixels points,
+        in the order the path is drawn
+
+    Without x_range, minmax buckets are consecutive runs of rows (for paths
+    that do not run along x).
+
+    Rows with non finite x or y are kept, so line breaks survive.
+    Returns a subset of data.
+    """
+    if method not in downsample_methods:
+        raise ValueError(
+            f"downsample must be one of {downsample_methods}, was {method!r}"
+        )
+    groups = data["group"].to_numpy()
+    if x_range is not None:
+        order = np.lexsort((data["x"].to_numpy(), groups))
+    else:
+        order = np.argsort(groups, kind="stable")
+    data = data.iloc[order]
+    groups = groups[order]
+    x = data["x"].to_numpy(dtype=float)
+    y = data["y"].to_numpy(dtype=float)
+    starts = _run_starts(groups)
+    sizes = np.diff(np.append(starts, len(groups)))
+
+    if method == "lttb":
+        keep = []
+        for start, size in zip(starts, sizes):
+            stop = start + size
+            keep.append(start + _lttb_runs(x[start:stop], y[start:stop], 2 * pixels))
+        return data.iloc[np.concatenate(keep)]
+
+    if x_range is not None:
+        low, high = x_range
+        extent = (high - low) or 1
+        column = np.floor((x - low) / extent * pixels)
+        column = np.clip(np.nan_to_num(column, nan=-1), -1, pixels)
+    else:
+        rank = np.arange(len(x)) - np.repeat(starts, sizes)
+        column = np.floor(rank / np.repeat(sizes, sizes) * pixels)
+    # a new bucket starts with each group, pixel column and line break
+    gap = ~(np.isfinite(x) & np.isfinite(y))
+    new = np.zeros(len(x), dtype=bool)
+    new[starts] = True
+    new[1:] |= column[1:] != column[:-1]
+    new[1:] |= gap[1:] | gap[:-1]
+    return data.iloc[minmax_indices(np.flatnonzero(new), y)]
+
+
+def _first_valid(isna):
+    """Per column: position of the first False, 1 if there is none
+    (plotnine's match(..., nomatch=1))"""
+    found = ~isna
+    return np.where(found.any(axis=0), found.argmax(axis=0), 1)
+
+
+class _downsampled:
+    def handle_na(self, data):
+        # geom_path.handle_na, vectorized - it ran a python match per column
+        if not self.params["downsample"]:
+            return super().handle_na(data)
+        isna = data[["x", "y", "size", "color", "linetype"]].isna().to_numpy()
+        n = len(data)
+        first = _first_valid(isna).max(initial=0)
+        last = n - _first_valid(isna[::-1]).max(initial=0)
+        if first == 0 and last == n:
+            return data
+        keep = np.zeros(n, dtype=bool)
+        keep[first:last] = True
+        if not self.params["na_rm"]:
+            warn(
+                f"geom_path: Removed {n - keep.sum()} rows containing missing values.",
+                PlotnineWarning,
+            )
+        return data.loc[keep].reset_index(drop=True)
+
+    def draw_panel(self, data, panel_params, coord, ax, **params):
+        # plotnine < 0.15 hands the params in, later versions use self.params
+        method = (params or self.params)["downsample"]
+        # non cartesian coords bend the pixel grid - leave those alone
+        if method and isinstance(coord, coord_cartesian):
+            width, height = ax.figure.get_size_inches() * ax.figure.dpi
+            pixels = int(np.ceil(max(width, height)))
+            if data["group"].value_counts().max() > 4 * pixels:
+                data = downsample_lines(
+                    data,
+                    pixels,
+                    method,
+                    panel_params.x.range if self.along_x else None,
+                )
+                data = data.reset_index(drop=True)
+        super().draw_panel(data, panel_params, coord, ax, **params)
+
+
+_doc = """
+    {what}, drawing only the vertices visible at the output resolution.
+
+    downsample='minmax' keeps per group and pixel column the first, last,
+    lowest and highest point, so peaks and troughs survive exactly.
+    downsample='lttb' uses Largest-Triangle-Three-Buckets
+    (2 points per pixel, per group) - smoother, but may miss single spikes.
+    The pixel grid is figure size * dpi, groups with at most
+    4 points per pixel are drawn unchanged.
+
+    {{usage}}
+
+    Parameters
+    ----------
+    downsample: 'minmax' | 'lttb' | None
+        default: None (draw all vertices)
+
+    {{common_parameters}}
+    """
+
+
+class geom_path_downsampled(_downsampled, geom_path):
+    __doc__ = _doc.format(what="Connected points (in data order)")
+    DEFAULT_PARAMS: ClassVar[dict] = {**geom_path.DEFAULT_PARAMS, "downsample": None}
+    along_x = False
+
+
+class geom_line_downsampled(_downsampled, geom_line):
+    __doc__ = _doc.format(what="Connected points (ordered by x)")
+    DEFAULT_PARAMS: ClassVar[dict] = {**geom_line.DEFAULT_PARAMS, "downsample": None}
+    along_x = True
+
+
+class geom_step_downsampled(_downsampled, geom_step):
+    __doc__ = _doc.format(what="Stepped connected points")
+    DEFAULT_PARAMS: ClassVar[dict] = {**geom_step.DEFAULT_PARAMS, "downsample": None}
+    along_x = True
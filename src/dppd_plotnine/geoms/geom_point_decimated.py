@@ -0,0 +1,87 @@
+from typing import ClassVar
+
+import numpy as np
+import pandas as pd
+from plotnine.coords.coord_cartesian import coord_cartesian
+from plotnine.geoms.geom_point import geom_point
+
+# aesthetics that make two points in the same pixel look different
+visual_aes = ["color", "fill", "shape", "size", "alpha", "stroke"]
+
+
+class geom_point_decimated(geom_point):
+    """
+    Points, thinned to what is visible at the output resolution.
+
+    Points are binned to the pixel grid of the figure (figure size * dpi),
+    and only one point per pixel and visual appearance (color, fill, shape,
+    size, alpha, stroke) is drawn - the one drawn last.
+    The points at the extremes of x and y are always kept,
+    sparse outliers keep their own pixel anyway.
+
+    Overplotting with alpha < 1 no longer accumulates.
+
+    {usage}
+    plot += geom_point_decimated(aes('x', 'y'), max_points=100000)
+
+    Parameters
+    ----------
+    max_points: int
+        default: 0
+        panels with at most this many points are drawn unchanged
+
+    {common_parameters}
+    """
+
+    DEFAULT_PARAMS: ClassVar[dict] = {**geom_point.DEFAULT_PARAMS, "max_points": 0}
+
+    def draw_panel(self, data, panel_params, coord, ax, **params):
+        # plotnine < 0.15 hands the params in, later versions use self.params
+        max_points = (params or self.params)["max_points"]
+        # non cartesian coords bend the pixel grid - leave those alone
+        if len(data) > max_points and isinstance(coord, coord_cartesian):
+            width, height = ax.figure.get_size_inches() * ax.figure.dpi
+            data = decimate_points(data, int(np.ceil(max(width, height))))
+        super().draw_panel(data, panel_params, coord, ax, **params)
+
+
+def _pixel_bins(values, pixels):
+    """Pixel of each value, spanning the finite values - non-finite ones get -1
+    (a single inf must not squeeze everything else into one pixel)"""
+    finite = np.isfinite(values)
+    if not finite.any():
+        return np.full(len(values), -1, dtype=np.int64)
+    lower = values[finite].min()
+    extent = values[finite].max() - lower
+    if extent == 0:
+        return np.where(finite, 0, -1)
+    bins = np.floor((values - lower) / extent * (pixels - 1))
+    return np.where(finite, bins, -1).astype(np.int64)
+
+
+def decimate_points(data, pixels):
+    """Keep the last drawn point per (pixel, visual appearance)
+    on a pixels x pixels grid, plus the x/y extremes and non-finite rows.
+
+    Returns a subset of data in original order.
+    """
+    x = data["x"].to_numpy(dtype=float)
+    y = data["y"].to_numpy(dtype=float)
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.any():
+        return data
+    key = _pixel_bins(x, pixels) * (pixels + 1) + _pixel_bins(y, pixels) + 1
+    for column in visual_aes:
+        if column in data:
+            codes, uniques = pd.factorize(data[column], use_na_sentinel=False)
+            key = pd.factorize(key * len(uniques) + codes)[0]
+    reversed_key = key[::-1]
+    _, last = np.unique(reversed_key, return_index=True)
+    keep = len(key) - 1 - last
+    rows = np.flatnonzero(finite)
+    extremes = rows[
+        [x[rows].argmin(), x[rows].argmax(), y[rows].argmin(), y[rows].argmax()]
+    ]
+    keep = np.union1d(keep, extremes)
+    keep = np.union1d(keep, np.flatnonzero(~finite))
+    return data.iloc[keep]
@@ -0,0 +1,166 @@
+import copy
+from typing import ClassVar
+
+import pandas as pd
+from plotnine.geoms.geom_bar import geom_bar
+from plotnine.geoms.geom_boxplot import geom_boxplot
+from plotnine.geoms.geom_line import geom_line
+from plotnine.geoms.geom_point import geom_point
+
+from .geom_path_downsampled import _downsampled, geom_line_downsampled
+from .geom_point_decimated import geom_point_decimated
+
+
+class glowing:
+    """
+    Mixin drawing a geom several times from the same computed data -
+    first once per glow stroke, then as usual.
+
+    glow: sequence of dicts, one per stroke, drawn in order.
+        'grow' is added to the size,
+        aesthetics (e.g. 'alpha', 'color') replace the data's,
+        anything else replaces a geom parameter (e.g. 'outlier_size').
+
+    Aesthetics are mapped and stats computed once,
+    instead of once per stacked layer.
+    """
+
+    def _stroke_data(self, data, stroke):
+        # legend keys are a Series - copy those, they are tiny
+        out = data.copy(deep=isinstance(data, pd.Series))
+        aesthetics = self.aesthetics()
+        for key, value in stroke.items():
+            if key == "grow":
+                if "size" in out:
+                    out["size"] = out["size"] + value
+            elif key in aesthetics:
+                out[key] = value
+        return out
+
+    def _stroke_params(self, stroke):
+        aesthetics = self.aesthetics()
+        return {k: v for k, v in stroke.items() if k != "grow" and k not in aesthetics}
+
+    def draw_panel(self, data, panel_params, coord, ax, **params):
+        # plotnine < 0.15 hands the params in, later versions use self.params
+        base = params or self.params
+        for stroke in base["glow"]:
+            stroke_params = {**base, **self._stroke_params(stroke)}
+            # the stroke's own geom - self is shared by concurrent renders
+            stroke_geom = copy.copy(self)
+            stroke_geom.params = stroke_params
+            super(glowing, stroke_geom).draw_panel(
+                self._stroke_data(data, stroke),
+                panel_params,
+                coord,
+                ax,
+                **(stroke_params if params else {}),
+            )
+        super().draw_panel(data, panel_params, coord, ax, **params)
+
+    @staticmethod
+    def draw_legend(data, da, lyr):
+        geom = lyr.geom
+        base = super(glowing, geom).draw_legend
+        for stroke in geom.params["glow"]:
+            base(geom._stroke_data(data, stroke), da, lyr)
+        return base(data, da, lyr)
+
+    @staticmethod
+    def legend_key_size(data, min_size, lyr):
+        geom = lyr.geom
+        base = super(glowing, geom).legend_key_size
+        size = base(data, min_size, lyr)
+        for stroke in geom.params["glow"]:
+            size = base(geom._stroke_data(data, stroke), size, lyr)
+        return size
+
+
+class geom_point_glow(glowing, geom_point):
+    """
+    Points with glow strokes drawn beneath them, see glowing.
+
+    {usage}
+    plot += geom_point_glow(aes('x', 'y'), glow=[{'grow': 3, 'alpha': 0.1}])
+
+    {common_parameters}
+    """
+
+    DEFAULT_PARAMS: ClassVar[dict] = {**geom_point.DEFAULT_PARAMS, "glow": ()}
+
+
+class geom_line_glow(glowing, geom_line):
+    """
+    Lines with glow strokes drawn beneath them, see glowing.
+
+    {usage}
+    plot += geom_line_glow(aes('x', 'y'), glow=[{'grow': 4, 'alpha': 0.15}])
+
+    {common_parameters}
+    """
+
+    DEFAULT_PARAMS: ClassVar[dict] = {**geom_line.DEFAULT_PARAMS, "glow": ()}
+
+
+class geom_boxplot_glow(glowing, geom_boxplot):
+    """
+    Boxplots with glow strokes drawn beneath them, see glowing.
+    The box statistics are computed once for all strokes.
+
+    {usage}
+    plot += geom_boxplot_glow(aes('x', 'y'), glow=[{'size': 3, 'alpha': 0.1}])
+
+    {common_parameters}
+    """
+
+    DEFAULT_PARAMS: ClassVar[dict] = {**geom_boxplot.DEFAULT_PARAMS, "glow": ()}
+
+
+class geom_bar_glow(glowing, geom_bar):
+    """
+    Bars with glow strokes drawn beneath them, see glowing.
+
+    {usage}
+    plot += geom_bar_glow(aes('x'), glow=[{'grow': 2.5, 'alpha': 0.1}])
+
+    {common_parameters}
+    """
+
+    DEFAULT_PARAMS: ClassVar[dict] = {**geom_bar.DEFAULT_PARAMS, "glow": ()}
+
+
+# decimated / downsampled first, so the strokes share the thinned data
+
+
+class geom_point_decimated_glow(geom_point_decimated, geom_point_glow):
+    """
+    geom_point_decimated with glow strokes drawn beneath the points,
+    see glowing. Points are decimated once for all strokes.
+
+    {usage}
+    plot += geom_point_decimated_glow(aes('x', 'y'), max_points=100000,
+                                      glow=[{'grow': 3, 'alpha': 0.1}])
+
+    {common_parameters}
+    """
+
+    DEFAULT_PARAMS: ClassVar[dict] = {**geom_point_decimated.DEFAULT_PARAMS, "glow": ()}
+
+
+class geom_line_downsampled_glow(_downsampled, geom_line_glow):
+    """
+    geom_line_downsampled with glow strokes drawn beneath the lines,
+    see glowing. Lines are downsampled once for all strokes.
+
+    {usage}
+    plot += geom_line_downsampled_glow(aes('x', 'y'), downsample='minmax',
+                                       glow=[{'grow': 4, 'alpha': 0.15}])
+
+    {common_parameters}
+    """
+
+    DEFAULT_PARAMS: ClassVar[dict] = {
+        **geom_line_downsampled.DEFAULT_PARAMS,
+        "glow": (),
+    }
+    along_x = True
@@ -0,0 +1,163 @@
+import functools
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+from .shared import many_cat_colors
+
+# many maximally distinct colors for plots with a lot of categories
+#
+# The hand picked many_cat_colors come first, the rest is chosen greedily
+# from a grid of sRGB colors: each next color is the candidate farthest
+# (CIELAB distance) from all colors chosen so far - and from the white
+# background. The greedy sequence only grows with n, so the generated colors
+# of a large palette start with those of a small one.
+
+_version = 2  # part of the on disk cache key - bump when the colors change
+_grid_steps = 32  # candidates per sRGB channel
+_seeded_colors = ["#FFFFFF"]  # taken, but never returned
+_hex_color = re.compile(r"#[0-9A-Fa-f]{6}")
+
+_srgb_to_xyz = np.array(
+    [
+        [0.4124, 0.3576, 0.1805],
+        [0.2126, 0.7152, 0.0722],
+        [0.0193, 0.1192, 0.9505],
+    ]
+)
+_d65_white = np.array([0.95047, 1.0, 1.08883])
+
+
+def cache_dir():
+    """Where generated palettes are kept - $DPPD_PLOTNINE_CACHE or
+    $XDG_CACHE_HOME/dppd_plotnine (~/.cache/dppd_plotnine)"""
+    if "DPPD_PLOTNINE_CACHE" in os.environ:
+        return Path(os.environ["DPPD_PLOTNINE_CACHE"])
+    return (
+        Path(os.environ.get("XDG_CACHE_HOME") or Path("~/.cache").expanduser())
+        / "dppd_plotnine"
+    )
+
+
+def _hex_to_rgb(colors):
+    return (
+        np.array(
+            [[int(c[i : i + 2], 16) for i in (1, 3, 5)] for c in colors], dtype=float
+        )
+        / 255
+    )
+
+
+def _rgb_to_hex(rgb):
+    return [f"#{r:02X}{g:02X}{b:02X}" for r, g, b in np.round(rgb * 255).astype(int)]
+
+
+def rgb_to_lab(rgb):
+    """sRGB (0..1, shape (n, 3)) to CIELAB, D65 white"""
+    rgb = np.asarray(rgb, dtype=float)
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ _srgb_to_xyz.T / _d65_white
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack(
+        [116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])],
+        axis=1,
+    )
+
+
+def _candidates(seed):
+    """The sRGB grid, jittered within its cells for seed != 0"""
+    steps = np.linspace(0, 1, _grid_steps)
+    rgb = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), -1).reshape(-1, 3)
+    if seed:
+        jitter = np.random.default_rng(seed).uniform(-0.5, 0.5, rgb.shape)
+        rgb = np.clip(rgb + jitter / (_grid_steps - 1), 0, 1)
+    return rgb
+
+
+def _farthest_points(count, seed):
+    """The first count generated colors (after many_cat_colors), as hex strings"""
+    candidates = _candidates(seed)
+    if count > len(candidates):
+        raise ValueError(f"Can't generate more than {len(candidates)} extra colors")
+    lab = rgb_to_lab(candidates)
+    taken = rgb_to_lab(_hex_to_rgb(_seeded_colors + many_cat_colors))
+    # squared distance of each candidate to its nearest chosen color
+    nearest = np.full(len(lab), np.inf)
+    for color in taken:
+        np.minimum(nearest, ((lab - color) ** 2).sum(axis=1), out=nearest)
+    chosen = []
+    for _ in range(count):
+        best = int(np.argmax(nearest))
+        chosen.append(best)
+        np.minimum(nearest, ((lab - lab[best]) ** 2).sum(axis=1), out=nearest)
+    return _rgb_to_hex(candidates[chosen])
+
+
+def _cache_file(count, seed):
+    return cache_dir() / f"many_categories_v{_version}_{count}_{seed}.json"
+
+
+def _read_cache(filename, count):
+    """The colors cached in filename - None if missing, truncated or corrupt"""
+    try:
+        colors = json.loads(filename.read_text())
+    except (OSError, ValueError):
+        return None
+    if (
+        isinstance(colors, list)
+        and len(colors) == count
+        and all(isinstance(c, str) and _hex_color.fullmatch(c) for c in colors)
+    ):
+        return colors
+    return None
+
+
+@functools.lru_cache(maxsize=64)
+def _generated_colors(count, seed):
+    if count == 0:
+        return ()
+    filename = _cache_file(count, seed)
+    colors = _read_cache(filename, count)
+    if colors is not None:
+        return tuple(colors)
+    colors = _farthest_points(count, seed)
+    try:  # an unwritable cache only costs time
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        temp = filename.with_name(f"{filename.name}.{os.getpid()}")
+        temp.write_text(json.dumps(colors))
+        os.replace(temp, filename)
+    except OSError:
+        pass
+    return tuple(colors)
+
+
+def many_categories(n, offset=0, seed=0):
+    """n distinguishable colors (hex strings).
+
+    The distinct many_cat_colors come first, rotated by offset,
+    followed by generated ones (seed varies which).
+    Generated colors don't depend on offset, they are cached by (count, seed)
+    in memory and on disk (see cache_dir) - repeated calls cost nothing.
+    """
+    if n < 0 or offset < 0:
+        raise ValueError("n and offset must be >= 0")
+    hand_picked = list(dict.fromkeys(many_cat_colors))
+    n, offset, seed = int(n), int(offset) % len(hand_picked), int(seed)
+    hand_picked = hand_picked[offset:] + hand_picked[:offset]
+    if n <= len(hand_picked):
+        return hand_picked[:n]
+    return hand_picked + list(_generated_colors(n - len(hand_picked), seed))
+
+
+class many_categories_palette:
+    """A discrete palette of many_categories(n, offset, seed) - picklable"""
+
+    def __init__(self, offset=0, seed=0):
+        self.offset = offset
+        self.seed = seed
+
+    def __call__(self, n):
+        return many_categories(n, self.offset, self.seed)
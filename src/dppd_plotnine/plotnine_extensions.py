@@ -1,6 +1,19 @@
+import copy
+import functools
+from collections.abc import Iterable, Mapping, Sized
+from typing import ClassVar
+from warnings import warn
+
+import numpy as np
+import pandas as pd
 import plotnine as p9
 from dppd import register_verb
-from .shared import many_cat_colors
+from plotnine.exceptions import PlotnineWarning
+from plotnine.layer import Layers
+from plotnine.stats.stat import stat
+
+from .dppd_plotnine import _data_column, add_arg_spec, split_add_args
+from .shared import stat_method
 
 # verbs that extend the normal p9 spectrum
 
@@ -107,21 +120,94 @@ def hide_legend_title(plot):
     return _change_theme(plot, "legend_title", p9.element_blank())
 
 
+def _palette_positions(x, limits):
+    """Position of each x in limits (-1 if missing), without a python loop.
+    Categoricals are looked up once per category."""
+    limits = pd.Index(list(limits))
+    if isinstance(getattr(x, "dtype", None), pd.CategoricalDtype):
+        x = pd.Categorical(x)
+        per_category = limits.get_indexer(x.categories)
+        codes = x.codes
+        return np.where(codes >= 0, per_category[codes], -1)
+    return limits.get_indexer(pd.Index(x))
+
+
+class _manual_palette:
+    """A manual scale's palette - plotnine's is a closure, which can't be pickled"""
+
+    def __init__(self, values, scale_name):
+        self.values = values
+        self.scale_name = scale_name
+
+    def __call__(self, n):
+        if n > len(self.values):
+            warn(
+                f"The palette of {self.scale_name} can return a maximum of "
+                f"{len(self.values)} values. {n} were requested from it.",
+                PlotnineWarning,
+            )
+        return self.values
+
+
+class _array_lookup_map:
+    """Discrete scales mapping values to their palette by array lookup
+    - plotnine matches every value in python."""
+
+    def __post_init__(self, values):
+        super().__post_init__(values)
+        breaks = self.breaks
+        if (
+            isinstance(breaks, Iterable)
+            and isinstance(breaks, Sized)
+            and len(breaks) == len(values)
+            and not isinstance(values, Mapping)
+        ):
+            values = dict(zip(breaks, values))
+        self.palette = _manual_palette(values, self.__class__.__name__)
+
+    def map(self, x, limits=None):
+        if limits is None:
+            limits = self.final_limits
+        pal = self.palette(sum(~pd.isna(list(limits))))
+        if isinstance(pal, dict) or not pd.Index(list(limits)).is_unique:
+            return super().map(x, limits)
+        pal = np.asarray(pal, dtype=object)
+        idx = _palette_positions(x, limits)
+        found = (idx >= 0) & (idx < len(pal))
+        res = np.full(len(idx), self.na_value if self.na_translate else None, object)
+        res[found] = pal[idx[found]]
+        return list(res)
+
+
+class scale_color_manual_lookup(_array_lookup_map, p9.scale_color_manual):
+    """scale_color_manual, mapping by array lookup"""
+
+
+class scale_fill_manual_lookup(_array_lookup_map, p9.scale_fill_manual):
+    """scale_fill_manual, mapping by array lookup"""
+
+
+def _many_categories_scale(scale_class, offset, seed, kwargs):
+    from .palettes import many_categories_palette
+
+    scale = scale_class([], **kwargs)
+    scale.palette = many_categories_palette(offset, seed)
+    return scale
+
+
 @register_verb(types=p9.ggplot)
-def scale_fill_many_categories(plot, offset=0, **kwargs):
-    """A fill scale with some 23 fairly distinguishable colors"""
-    return plot + p9.scale_fill_manual(
-        (many_cat_colors + many_cat_colors)[offset : offset + len(many_cat_colors)],
-        **kwargs,
-    )
+def scale_fill_many_categories(plot, offset=0, seed=0, **kwargs):
+    """A fill scale with as many distinguishable colors as there are categories
+    - the 23 hand picked many_cat_colors, then generated ones (see palettes)"""
+    return plot + _many_categories_scale(scale_fill_manual_lookup, offset, seed, kwargs)
 
 
 @register_verb(types=p9.ggplot)
-def scale_color_many_categories(plot, offset=0, **kwargs):
-    """A color scale with some 23 fairly distinguishable colors"""
-    return plot + p9.scale_color_manual(
-        (many_cat_colors + many_cat_colors)[offset : offset + len(many_cat_colors)],
-        **kwargs,
+def scale_color_many_categories(plot, offset=0, seed=0, **kwargs):
+    """A color scale with as many distinguishable colors as there are categories
+    - the 23 hand picked many_cat_colors, then generated ones (see palettes)"""
+    return plot + _many_categories_scale(
+        scale_color_manual_lookup, offset, seed, kwargs
     )
 
 
@@ -142,45 +228,64 @@ def aes(_plot, *args, **kwargs):  # pragma: no cover
     return p9.aes(*args, **kwargs)
 
 
-@register_verb(types=p9.ggplot)
-def reverse_transform(_plot, trans):
-    # see https://github.com/has2k1/mizani/issues/56
-    import numpy as np
-
-    if isinstance(trans, str):
-        import mizani.transforms
-
-        trans = mizani.transforms.gettrans(trans)
+class _reversed:
+    """The methods turning a mizani transform around, see reversed_trans"""
 
-    def _transform(self, x):
-        return -1 * trans.transform(x)
+    def transform(self, x):
+        return -1 * self.trans.transform(x)
 
-    def _inverse(self, x):
-        return trans.inverse(np.array(x) * -1)
+    def inverse(self, x):
+        return self.trans.inverse(np.array(x) * -1)
 
-    def _breaks(self, limits):
-        return trans.breaks(limits=tuple(sorted(limits)))
+    def breaks(self, limits):
+        return self.trans.breaks(limits=tuple(sorted(limits)))
 
-    def _minor_breaks(self, major, limits=None, n=None):
-        return trans.minor_breaks(major, tuple(sorted(limits)))
+    def minor_breaks(self, major, limits=None, n=None):
+        return self.trans.minor_breaks(major, tuple(sorted(limits)))
 
-    # figure out the name and the transform class
+    def __reduce__(self):
+        return (reversed_trans, (self.trans,))
 
-    name = f"reversed_{trans.__class__.__name__}"
-    trans_class = trans.__class__
 
+@functools.cache
+def _reversed_class(trans_class):
+    # copied into the class, not a base - that would change the
+    # instance layout, and reversed_trans assigns __class__
+    methods = {
+        k: v
+        for k, v in vars(_reversed).items()
+        if k == "__reduce__" or not k.startswith("__")
+    }
     return type(
-        name,
+        f"reversed_{trans_class.__name__}",
         (trans_class,),
-        {
-            "transform": _transform,
-            "inverse": _inverse,
-            "breaks": _breaks,
-            "minor_breaks": _minor_breaks,
-        },
+        {**methods, "__module__": __name__},
     )
 
 
+def reversed_trans(trans):
+    """trans (a mizani transform) running the other way.
+
+    One class per transform class, the instance keeps trans' settings
+    (e.g. the log base). Pickles as reversed_trans(trans).
+    """
+    res = copy.copy(trans)
+    res.__class__ = _reversed_class(type(trans))
+    res.trans = trans
+    return res
+
+
+@register_verb(types=p9.ggplot)
+def reverse_transform(_plot, trans):
+    """A reversed transform for scale_*_continuous(trans=...)"""
+    # see https://github.com/has2k1/mizani/issues/56
+    if isinstance(trans, str):
+        import mizani.transforms
+
+        trans = mizani.transforms.gettrans(trans)
+    return reversed_trans(trans)
+
+
 @register_verb("render_args", types=p9.ggplot)
 def render_args(plot, **render_args):
     """preregister arguments that will be used on save"""
@@ -188,93 +293,127 @@ def render_args(plot, **render_args):
     return plot
 
 
-@register_verb("add_cummulative", types=p9.ggplot)
-def add_cummulative(plot, x_column, ascending=True, percent=False, percentile=1.0):
-    """Add a line showing cumulative % of data <= x.
-    if you specify a percentile, all data at the extreme range is dropped
-
+def cummulative_curve(values, ascending=True, percent=False, percentile=1.0):
+    """Step points (x, y) of a cumulative count curve, vectorized.
 
+    ascending: y = number of values >= x, otherwise number of values <= x.
+    percent: y in % of all (non-nan) values.
+    percentile: keep only this fraction of the values the curve starts with,
+        dropping the extreme end, negative values drop the start instead.
+        y still counts all values.
     """
-    import numpy as np
-    import pandas as pd
-    import itertools
-
-    total = 0
-    current = 0
-    column_data = plot.data[x_column].copy()  # explicit copy!
-    column_data = column_data[~np.isnan(column_data)]
-    column_data = np.sort(column_data)
-    total = float(len(column_data))
-    real_total = total
-    if not ascending:
-        column_data = column_data[::-1]  # numpy.reverse(column_data)
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    total = len(values)
+    x, counts = np.unique(values, return_counts=True)
+    up_to = np.cumsum(counts)  # values <= x
+    if ascending:
+        y = total - up_to + counts
+    else:
+        y = up_to
     if percentile != 1.0:
-        if ascending:
-            maximum = np.max(column_data)
+        keep = round(total * abs(percentile))
+        # position of each unique value in the order the curve walks the data
+        walk_start = (up_to - counts) if ascending else (total - up_to)
+        walk_end = walk_start + counts
+        if percentile > 0:
+            ok = walk_start < keep
         else:
-            maximum = np.min(column_data)
-        total = float(total * percentile)
-        if total > 0:
-            column_data = column_data[:total]
-            offset = real_total - total
-        else:
-            column_data = column_data[total:]
-            offset = 2 * abs(total)
-    else:
-        offset = 0
-    x_values = []
-    y_values = []
+            ok = walk_end > total - keep
+        x, y = x[ok], y[ok]
     if percent:
-        current = 100.0
-    else:
-        current = total
-    for value, group in itertools.groupby(column_data):
-        x_values.append(value)
-        y_values.append(current + offset)
-        if percent:
-            current -= len(list(group)) / total
-        else:
-            current -= len(list(group))
-        # y_values.append(current)
-    data = pd.DataFrame(
-        {x_column: x_values, ("%" if percent else "#") + " <=": y_values}
-    )
-    out_plot = plot
-    if percentile > 0:
-        out_plot = out_plot + p9.scale_x_continuous(
-            limits=[0, real_total if not percent else 100]
+        y = y * 100.0 / total
+    return x, y
+
+
+class stat_cummulative(stat):
+    """
+    Cumulative counts of x - one curve per group and panel.
+
+    See :func:`cummulative_curve` for the parameters.
+    """
+
+    REQUIRED_AES: ClassVar[set] = {"x"}
+    DEFAULT_PARAMS: ClassVar[dict] = {
+        "geom": "line",
+        "position": "identity",
+        "na_rm": False,
+        "ascending": True,
+        "percent": False,
+        "percentile": 1.0,
+    }
+    CREATES: ClassVar[set] = {"y"}
+
+    @stat_method
+    def compute_group(self, data, scales, **params):
+        params = params or self.params
+        x, y = cummulative_curve(
+            data["x"],
+            params["ascending"],
+            params["percent"],
+            params["percentile"],
         )
-    out_plot = out_plot + p9.geom_line(
-        p9.aes(x_column, ("%" if percent else "#") + " <="), data=data
+        return pd.DataFrame({"x": x, "y": y})
+
+
+@register_verb("add_cummulative", types=p9.ggplot)
+def add_cummulative(
+    plot, x_column, ascending=True, percent=False, percentile=1.0, **kwargs
+):
+    """Add a line showing the cumulative number (or %) of data >= x
+    (ascending=False: <= x).
+    if you specify a percentile, all data at the extreme range is dropped
+
+    Further kwargs follow the add_* convention (mapped, or unmapped with
+    a leading _), one curve is drawn per group (e.g. color=...) and facet.
+    """
+    mapped, non_mapped, other = split_add_args(add_arg_spec(p9.geom_line), (), kwargs)
+    # plotnine hands the stat's DEFAULT_PARAMS on to stat_cummulative
+    geom = p9.geom_line(
+        p9.aes(x=x_column, **mapped),
+        stat=stat_cummulative,
+        ascending=ascending,
+        percent=percent,
+        percentile=percentile,
+        **non_mapped,
     )
+    if "DEFAULT_AES" in other:
+        geom.DEFAULT_AES = {**geom.DEFAULT_AES, **other["DEFAULT_AES"]}
+    y_label = ("%" if percent else "#") + (" >=" if ascending else " <=")
+    out_plot = plot + geom
+    out_plot = out_plot + p9.ylab(y_label)
+    out_plot = out_plot + p9.expand_limits(y=[0, 100] if percent else 0)
     if percentile != 1.0:
-        out_plot = out_plot + p9.title(
+        values = _data_column(plot, x_column)
+        if ascending:
+            maximum = np.nanmax(values)
+        else:
+            maximum = np.nanmin(values)
+        out_plot = out_plot + p9.ggtitle(
             "showing only %.2f percentile, extreme was %.2f" % (percentile, maximum)
         )
     return out_plot
 
 
+class _legendless_layers(Layers):
+    """Layers dropping all guides - hide_legend on plotnine < 0.8"""
+
+    def compute_aesthetics(self, plot):
+        res = super().compute_aesthetics(plot)
+        for s in plot.scales:
+            s.guide = None
+        return res
+
+
 @register_verb("hide_legend", types=p9.ggplot)
 def hide_legend(plot):
     """Hide plot legend - whether you have manually defined a scale or not"""
-    import types
-
     if tuple([int(x) for x in p9.__version__.split(".")]) >= (0, 8, 0):
         return plot + p9.theme(legend_position="none")
     else:
-
-        def my_compute_aesthetics(self, p):
-            res = self._org_compute_aesthetics(p)
-            for s in p.scales:
-                s.guide = None
-            return res
-
-        plot.layers._org_compute_aesthetics = plot.layers.compute_aesthetics
-        # advanced monkey patching for the win!
-        plot.layers.compute_aesthetics = types.MethodType(
-            my_compute_aesthetics, plot.layers
-        )
-        return plot
+        res = copy.copy(plot)
+        res.layers = _legendless_layers(plot.layers)
+        return res
 
 
 @register_verb("sc10", types=p9.ggplot)
@@ -347,67 +486,52 @@ cyberpunk_colors = [
 
 @register_verb("scale_color_cyberpunk", types=p9.ggplot)
 def scale_color_cyberpunk(plot, **kwargs):
-    return plot + p9.scale_color_manual(cyberpunk_colors, **kwargs)
+    return plot + scale_color_manual_lookup(cyberpunk_colors, **kwargs)
 
 
 @register_verb("scale_fill_cyberpunk", types=p9.ggplot)
 def scale_fill_cyberpunk(plot, **kwargs):
-    return plot + p9.scale_fill_manual(cyberpunk_colors, **kwargs)
+    return plot + scale_fill_manual_lookup(cyberpunk_colors, **kwargs)
 
 
-@register_verb("cyberpunk", types=p9.ggplot, pass_dppd=True)
-def cyberpunk(dppd):
-    """Turn this plot into a cyberpunk styled plot with theme and glowing figures"""
-    res = dppd.theme_cyberpunk().scale_color_cyberpunk().scale_fill_cyberpunk()
-    res.df.cyberpunked = True
-    # res.add_scatter = res.add_scatter_cyberpunk
-    # res.add_line = res.add_line_cyberpunk
+@register_verb("cyberpunk", types=p9.ggplot)
+def cyberpunk(plot):
+    """Turn this plot into a cyberpunk styled plot with theme and glowing figures
+    - add_point / add_line / add_boxplot / add_bar glow from here on"""
+    res = scale_fill_cyberpunk(scale_color_cyberpunk(theme_cyberpunk(plot)))
+    res.cyberpunked = True
     return res
 
 
+def _glow_color(dppd, cls, kwargs):
+    """The glow strokes' color - the geom's default, unless color is mapped or set.
+    (The cyberpunk geom itself defaults to white)"""
+    if "color" in kwargs or "_color" in kwargs or "color" in dppd.df.mapping:
+        return {}
+    return {"color": cls.DEFAULT_AES["color"]}
+
+
 @register_verb(
     ["add_scatter_cyberpunk", "add_point_cyberpunk"], types=p9.ggplot, pass_dppd=True
 )
 def add_scatter_cyberpunk(dppd, *args, **kwargs):
-    kwargs_glow = kwargs.copy()
-    if "size" in kwargs:
-        kwargs_glow["size"] = kwargs["size"] + " + 3"
-    elif "_size" in kwargs:
-        kwargs_glow["_size"] = kwargs["_size"] + 3
-    else:
+    if "_size" not in kwargs and "size" not in kwargs:
         kwargs["_size"] = 2
-        kwargs_glow["_size"] = 5
-    kwargs_glow["_alpha"] = 0.1
-    res = dppd._add_point(*args, **kwargs_glow)
-    return res._add_point(*args, **kwargs, DEFAULT_AES={"color": "white"})
+    glow = {"grow": 3, "alpha": 0.1, **_glow_color(dppd, p9.geom_point, kwargs)}
+    return dppd._add_point(
+        *args, **kwargs, _glow=[glow], DEFAULT_AES={"color": "white"}
+    )
 
 
 @register_verb("add_line_cyberpunk", types=p9.ggplot, pass_dppd=True)
 def add_line_cyberpunk(dppd, *args, **kwargs):
-    kwargs_glow1 = kwargs.copy()
-    kwargs_glow2 = kwargs.copy()
-    if "size" in kwargs:
-        kwargs_glow1["size"] = kwargs["size"] + " + 1"
-        kwargs_glow2["size"] = kwargs["size"] + " + 4"
-    elif "_size" in kwargs:
-        kwargs_glow1["_size"] = kwargs["_size"] + 1
-        kwargs_glow2["_size"] = kwargs["_size"] + 4
-    else:
+    if "_size" not in kwargs and "size" not in kwargs:
         kwargs["_size"] = 0.5
-        kwargs_glow1["_size"] = kwargs["_size"] + 1
-        kwargs_glow2["_size"] = kwargs["_size"] + 4
-    kwargs_glow1["_alpha"] = 0.3
-    kwargs_glow2["_alpha"] = 0.15
     if not "color" in kwargs and not "_color" in kwargs:
         kwargs["color"] = '"a"'
-        kwargs_glow1["color"] = '"a"'
-        kwargs_glow2["color"] = '"a"'
         kwargs["_show_legend"] = False
-        kwargs_glow1["_show_legend"] = False
-        kwargs_glow2["_show_legend"] = False
-    res = dppd._add_line(*args, **kwargs_glow2)
-    res = res._add_line(*args, **kwargs_glow1)
-    return res._add_line(*args, **kwargs, DEFAULT_AES={"color": "white"})
+    glow = [{"grow": 4, "alpha": 0.15}, {"grow": 1, "alpha": 0.3}]
+    return dppd._add_line(*args, **kwargs, _glow=glow, DEFAULT_AES={"color": "white"})
 
 
 @register_verb("add_boxplot_cyberpunk", types=p9.ggplot, pass_dppd=True)
@@ -416,25 +540,24 @@ def add_boxplot_cyberpunk(dppd, *args, **kwargs):
         kwargs["_outlier_size"] = 1.5
     if not "fill" in kwargs and not "_fill" in kwargs:
         kwargs["_fill"] = None
-    kwargs_glow1 = kwargs.copy()
-    kwargs_glow1["_outlier_size"] = kwargs["_outlier_size"] + 3
-    kwargs_glow1["_outlier_alpha"] = 0.1
-    kwargs_glow1["_size"] = 3
-    kwargs_glow1["_alpha"] = 0.1
-    kwargs["_outlier_size"] = 1.5
-    res = dppd._add_boxplot(*args, **kwargs_glow1)
-    return res._add_boxplot(*args, **kwargs, DEFAULT_AES={"color": "white"})
+    glow = {
+        "size": 3,
+        "alpha": 0.1,
+        "outlier_size": kwargs["_outlier_size"] + 3,
+        "outlier_alpha": 0.1,
+        **_glow_color(dppd, p9.geom_boxplot, kwargs),
+    }
+    return dppd._add_boxplot(
+        *args, **kwargs, _glow=[glow], DEFAULT_AES={"color": "white"}
+    )
 
 
 @register_verb("add_bar_cyberpunk", types=p9.ggplot, pass_dppd=True)
 def add_bar_cyberpunk(dppd, *args, **kwargs):
     if not "_size" in kwargs:
         kwargs["_size"] = 0.5
-    kwargs_glow1 = kwargs.copy()
+    glow = {"grow": 2.5, "alpha": 0.1, **_glow_color(dppd, p9.geom_bar, kwargs)}
     if not "fill" in kwargs and not "_fill" in kwargs:
-        kwargs_glow1["_fill"] = "blue"
+        glow["fill"] = "blue"
         kwargs["_fill"] = None
-    kwargs_glow1["_alpha"] = 0.1
-    kwargs_glow1["_size"] = kwargs["_size"] + 2.5
-    res = dppd._add_bar(*args, **kwargs_glow1)
-    return res._add_bar(*args, **kwargs, DEFAULT_AES={"color": "white"})
+    return dppd._add_bar(*args, **kwargs, _glow=[glow], DEFAULT_AES={"color": "white"})
@@ -0,0 +1,141 @@
+import copy
+import logging
+import time
+
+import plotnine as p9
+from plotnine.layer import Layers
+
+# per phase & per layer timings of a save - see save(..., profile=True)
+
+logger = logging.getLogger("dppd_plotnine.profiling")
+
+_recording = None  # the RenderTimings of the save in progress (under render_lock)
+
+
+class RenderTimings:
+    def __init__(self):
+        self.phases = {}
+        self.layers = []
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def add_layer_step(self, index, layer, step, seconds):
+        while len(self.layers) <= index:
+            self.layers.append({"index": len(self.layers)})
+        entry = self.layers[index]
+        entry.setdefault("geom", type(layer.geom).__name__)
+        entry.setdefault("stat", type(layer.stat).__name__)
+        entry[step] = entry.get(step, 0) + seconds
+
+    def as_dict(self, total):
+        phases = dict(self.phases)
+        drawn = phases.pop("draw", 0)
+        # facet, guide & theme setup and application
+        phases["other_draw"] = drawn - sum(phases.values())
+        # deepcopy, layout engine & writing the file
+        phases["encode"] = total - drawn
+        steps = {}
+        for entry in self.layers:
+            timed = {k: v for k, v in entry.items() if isinstance(v, float)}
+            entry["total"] = sum(timed.values())
+            for k, v in timed.items():
+                steps[k] = steps.get(k, 0) + v
+        return {"total": total, "phases": phases, "steps": steps, "layers": self.layers}
+
+
+def _timed_phase(name):
+    def method(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return getattr(super(profiled_ggplot, self), name)(*args, **kwargs)
+        finally:
+            _recording.add_phase(name.strip("_"), time.perf_counter() - start)
+
+    method.__name__ = name
+    return method
+
+
+def _timed_steps(step):
+    """Run a Layers step one layer at a time, timing each"""
+
+    def method(self, *args):
+        for index, layer in enumerate(self):
+            start = time.perf_counter()
+            getattr(Layers, step)(Layers([layer]), *args)
+            _recording.add_layer_step(index, layer, step, time.perf_counter() - start)
+
+    method.__name__ = step
+    return method
+
+
+class profiled_layers(Layers):
+    """Layers that time every step per layer"""
+
+    def setup(self, plot):
+        # Layers.setup numbers the layers - keep that
+        for index, layer in enumerate(self):
+            layer.zorder = index + 1
+            start = time.perf_counter()
+            layer.setup(plot)
+            _recording.add_layer_step(
+                index, layer, "setup", time.perf_counter() - start
+            )
+
+    compute_aesthetics = _timed_steps("compute_aesthetics")
+    transform = _timed_steps("transform")
+    compute_statistic = _timed_steps("compute_statistic")
+    map_statistic = _timed_steps("map_statistic")
+    setup_data = _timed_steps("setup_data")
+    compute_position = _timed_steps("compute_position")
+    train = _timed_steps("train")
+    map = _timed_steps("map")
+    use_defaults_after_scale = _timed_steps("use_defaults_after_scale")
+    finish_statistics = _timed_steps("finish_statistics")
+    draw = _timed_steps("draw")
+
+
+class profiled_ggplot(p9.ggplot):
+    """A ggplot timing its build and draw phases"""
+
+    draw = _timed_phase("draw")
+    _setup = _timed_phase("_setup")
+    _draw_layers = _timed_phase("_draw_layers")
+    _draw_panel_borders = _timed_phase("_draw_panel_borders")
+    _draw_breaks_and_labels = _timed_phase("_draw_breaks_and_labels")
+    _draw_figure_texts = _timed_phase("_draw_figure_texts")
+    _draw_watermarks = _timed_phase("_draw_watermarks")
+    _draw_figure_background = _timed_phase("_draw_figure_background")
+
+    def _build(self):
+        self.layers = profiled_layers(self.layers)
+        start = time.perf_counter()
+        try:
+            return super()._build()
+        finally:
+            _recording.add_phase("build", time.perf_counter() - start)
+
+
+def profiled_save(plot, *args, **kwargs):
+    """plot.save(*args, **kwargs), returning its timings.
+
+    Must be called with render_lock held.
+    """
+    global _recording
+    profiled = copy.copy(plot)
+    profiled.__class__ = profiled_ggplot
+    _recording = RenderTimings()
+    start = time.perf_counter()
+    try:
+        profiled.save(*args, **kwargs)
+        timings = _recording.as_dict(time.perf_counter() - start)
+    finally:
+        _recording = None
+    filename = args[0] if args else kwargs.get("filename")
+    logger.info(
+        "rendered %s in %.3fs",
+        filename,
+        timings["total"],
+        extra={"render_timings": timings, "render_filename": str(filename)},
+    )
+    return timings
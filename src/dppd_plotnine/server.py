@@ -0,0 +1,518 @@
+"""A local plot rendering service.
+
+    python -m dppd_plotnine.server --port 8765 --workers 4
+
+POST /render?format=png with the data as body (Content-Type text/csv,
+application/vnd.apache.parquet or application/vnd.apache.arrow.file -
+the latter two need pyarrow) and the verb chain as JSON in the
+X-Dppd-Chain header:
+
+    [["p9", [], {"prune": true}],
+     ["add_point", ["x", "y"], {"color": "group"}],
+     ["render_args", [], {"size": "a6"}]]
+
+Each entry is [verb, args, kwargs] (args and kwargs may be left off),
+applied to dp(data). A leading p9 is added if missing. Only verbs
+registered on ggplot are allowed, none that save.
+Returns the encoded plot, X-Cache: hit/miss tells whether it came
+from the cache (keyed by a hash of data, chain and format).
+
+GET /metrics returns request, cache and render counts and latencies as
+JSON, GET /health 'ok'.
+
+Plots are rendered in a pool of worker processes that import plotnine
+and render a warm-up plot before the first request arrives.
+
+Binds to loopback addresses only - aes expressions are evaluated as
+python code. --unsafe-allow-remote lifts that, for trusted networks.
+Requests whose Host header is not the server's loopback address (a
+DNS rebinding web page) and cross origin requests from browsers are
+answered with 403.
+A worker process that dies is replaced, its request answered with 400.
+Requests that fail (bad data, chain or aes) are answered with 400 and
+the error message, internal failures with 500 - their traceback goes to
+the 'dppd_plotnine.server' logger.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import hashlib
+import http.server
+import io
+import ipaddress
+import json
+import logging
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger("dppd_plotnine.server")
+
+formats = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+    "pdf": "application/pdf",
+}
+
+readers = {
+    "text/csv": "read_csv",
+    "application/vnd.apache.parquet": "read_parquet",
+    "application/vnd.apache.arrow.file": "read_feather",
+}
+
+
+class RenderError(Exception):
+    """A request that could not be rendered - reported as 400"""
+
+
+def is_loopback(host):
+    """Whether host only ever resolves to loopback addresses"""
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except (socket.gaierror, UnicodeError):
+        return False
+    return bool(infos) and all(
+        ipaddress.ip_address(info[4][0].split("%")[0]).is_loopback for info in infos
+    )
+
+
+def _host_header(host, port):
+    """The Host header of requests to host:port"""
+    if ":" in host:  # IPv6
+        host = f"[{host}]"
+    return host if port == 80 else f"{host}:{port}"
+
+
+def _init_worker():
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import pandas as pd
+    from dppd import dppd
+
+    import dppd_plotnine  # noqa: F401
+
+    # fonts, font cache & lazily imported plotnine modules
+    dp, _ = dppd()
+    dp(pd.DataFrame({"x": [0, 1]})).p9().add_point("x", "x").render_bytes()
+
+
+def _is_plot_verb(name):
+    import plotnine as p9
+    from dppd.base import verb_registry
+
+    if name.startswith("save") or (name.startswith("render") and name != "render_args"):
+        return False
+    return (name, p9.ggplot) in verb_registry
+
+
+def _render(data, content_type, chain, format):
+    """Runs in a worker: parse data, apply chain, return the encoded plot"""
+    import pandas as pd
+    import plotnine as p9
+    from dppd import dppd
+
+    from .dppd_plotnine import render_bytes
+
+    try:
+        reader = getattr(pd, readers[content_type])
+        df = reader(io.BytesIO(data))
+    except KeyError:
+        raise RenderError(
+            f"unsupported Content-Type {content_type!r}, use one of {sorted(readers)}"
+        )
+    except ImportError as e:
+        raise RenderError(f"can't read {content_type}: {e}")
+    dp, _ = dppd()
+    plot = dp(df)
+    try:
+        for index, (name, args, kwargs) in enumerate(chain):
+            if index == 0 and name == "p9":
+                plot = plot.p9(*args, **kwargs)
+                continue
+            if not _is_plot_verb(name):
+                raise RenderError(f"{name!r} is not an allowed plot verb")
+            plot = getattr(plot, name)(*args, **kwargs)
+        plot = plot.pd
+        if not isinstance(plot, p9.ggplot):
+            raise RenderError("the chain did not produce a plot")
+        return render_bytes(plot, format)
+    except RenderError:
+        raise
+    except Exception as e:
+        # verbs, their arguments and aes expressions are the request's
+        raise RenderError(f"{type(e).__name__}: {e}") from e
+
+
+def parse_chain(text):
+    """[[verb, args, kwargs], ...] from JSON, with a leading p9"""
+    try:
+        raw = json.loads(text)
+    except ValueError as e:
+        raise RenderError(f"X-Dppd-Chain is not valid JSON: {e}")
+    if not isinstance(raw, list):
+        raise RenderError("X-Dppd-Chain must be a list of [verb, args, kwargs]")
+    chain = []
+    for entry in raw:
+        if isinstance(entry, str):
+            entry = [entry]
+        if (
+            not isinstance(entry, list)
+            or not 1 <= len(entry) <= 3
+            or not isinstance(entry[0], str)
+        ):
+            raise RenderError(f"not a [verb, args, kwargs] entry: {entry!r}")
+        name, args, kwargs = entry[0], [], {}
+        if len(entry) > 1:
+            args = entry[1]
+        if len(entry) > 2:
+            kwargs = entry[2]
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise RenderError(f"args must be a list and kwargs a dict: {entry!r}")
+        chain.append((name, args, kwargs))
+    if not chain or chain[0][0] != "p9":
+        chain.insert(0, ("p9", [], {}))
+    return chain
+
+
+class RenderCache:
+    """Rendered plots by request fingerprint, least recently used out first"""
+
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        return None
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, dropped = self._entries.popitem(last=False)
+                self.size -= len(dropped)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Metrics:
+    """Counters and the latencies of the last window renders"""
+
+    def __init__(self, window=1000):
+        self.started = time.time()
+        self.counts = collections.Counter()
+        self.latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def record(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def as_dict(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            counts = dict(self.counts)
+        uptime = time.time() - self.started
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "uptime": uptime,
+            "counts": counts,
+            "renders_per_second": counts.get("rendered", 0) / uptime,
+            "latency": {
+                "mean": sum(latencies) / len(latencies) if latencies else None,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": latencies[-1] if latencies else None,
+            },
+        }
+
+
+class RenderServer:
+    """The rendering service - see the module docstring.
+
+    port=0 picks a free port (see .url).
+    workers: number of render processes
+    cache_bytes: how much rendered output to keep
+    allow_remote: bind to non loopback hosts - anyone who can reach
+        the port can run python code in the workers
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        workers=2,
+        cache_bytes=256 * 2**20,
+        allow_remote=False,
+    ):
+        if not allow_remote and not is_loopback(host):
+            raise ValueError(
+                f"Refusing to serve on {host!r}: requests run python code. "
+                "Bind to a loopback address, or pass allow_remote=True "
+                "(--unsafe-allow-remote) on a trusted network."
+            )
+        self.workers = workers
+        self.executor = self._new_executor()
+        self._executor_lock = threading.Lock()
+        self.cache = RenderCache(cache_bytes)
+        self.metrics = Metrics()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self.httpd = http.server.ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.render_server = self
+        # what a loopback server is reached as - None: anything
+        self.allowed_hosts = None
+        if not allow_remote:
+            bound_host, bound_port = self.httpd.server_address[:2]
+            self.allowed_hosts = {
+                _host_header(name, bound_port)
+                for name in (host, bound_host, "localhost")
+            }
+        self._thread = None
+
+    def _new_executor(self):
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn"
+        )
+        return concurrent.futures.ProcessPoolExecutor(
+            self.workers, mp_context=ctx, initializer=_init_worker
+        )
+
+    def _replace_executor(self, broken):
+        """A worker died - start a new pool, unless another request did"""
+        with self._executor_lock:
+            if self.executor is broken:
+                self.executor = self._new_executor()
+                self.metrics.count("worker_restarts")
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def warm_up(self):
+        """Start all worker processes now, instead of on the first requests"""
+        concurrent.futures.wait(
+            [self.executor.submit(time.sleep, 0.1) for _ in range(self.workers)]
+        )
+
+    def start(self):
+        """Warm up the workers and serve in a background thread"""
+        self.warm_up()
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="dppd_plotnine_server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def render(self, data, content_type, chain, format):
+        """(encoded plot, cache hit?) - identical requests in flight
+        at the same time are rendered once"""
+        h = hashlib.sha256()
+        for part in content_type, json.dumps(chain, sort_keys=True), format:
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        h.update(data)
+        key = h.hexdigest()
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.metrics.count("cache_hits")
+            return cached, True
+        self.metrics.count("cache_misses")
+        with self._inflight_lock:
+            future, executor = self._inflight.get(key, (None, self.executor))
+            submitted = future is None
+            if submitted:
+                try:
+                    future = executor.submit(_render, data, content_type, chain, format)
+                except BrokenProcessPool:
+                    self._replace_executor(executor)
+                    raise RenderError("the render workers died, try again")
+                self._inflight[key] = future, executor
+        if submitted:  # outside the lock - a done future calls back right away
+            future.add_done_callback(lambda done: self._forget(key, done))
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            raise RenderError("a render worker died on this request")
+        self.cache.put(key, result)
+        return result, False
+
+    def _forget(self, key, future):
+        with self._inflight_lock:
+            if self._inflight.get(key, (None,))[0] is future:
+                del self._inflight[key]
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    server_version = "dppd_plotnine"
+
+    def log_message(self, format, *args):  # quiet by default
+        pass
+
+    def _reply(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._reply(status, message.encode("utf-8"), "text/plain; charset=utf-8")
+
+    def _refused(self):
+        """Answer requests a web page made the browser send with 403 -
+        loopback servers only accept their own Host, and nobody
+        other origins"""
+        server = self.server.render_server
+        host = self.headers.get("Host")
+        origin = self.headers.get("Origin")
+        if server.allowed_hosts is not None and host not in server.allowed_hosts:
+            message = f"Host {host!r} is not this server"
+        elif origin is not None and urllib.parse.urlsplit(origin).netloc != host:
+            message = "cross origin requests are not allowed"
+        else:
+            return False
+        server.metrics.count("refused")
+        self._error(403, message)
+        return True
+
+    def do_GET(self):
+        server = self.server.render_server
+        if self._refused():
+            return
+        path = urllib.parse.urlsplit(self.path).path
+        if path == "/metrics":
+            metrics = server.metrics.as_dict()
+            metrics["cache"] = {
+                "entries": len(server.cache),
+                "bytes": server.cache.size,
+            }
+            metrics["workers"] = server.workers
+            self._reply(200, json.dumps(metrics).encode("utf-8"), "application/json")
+        elif path == "/health":
+            self._reply(200, b"ok", "text/plain")
+        else:
+            self._error(404, "GET /metrics or /health, POST /render")
+
+    def do_POST(self):
+        server = self.server.render_server
+        if self._refused():
+            return
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/render":
+            self._error(404, "POST /render")
+            return
+        server.metrics.count("requests")
+        start = time.perf_counter()
+        try:
+            format = urllib.parse.parse_qs(url.query).get("format", ["png"])[0]
+            if format not in formats:
+                raise RenderError(f"format must be one of {sorted(formats)}")
+            chain = parse_chain(self.headers.get("X-Dppd-Chain", "[]"))
+            content_type = self.headers.get("Content-Type", "text/csv")
+            content_type = content_type.split(";")[0].strip()
+            data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            body, hit = server.render(data, content_type, chain, format)
+        except RenderError as e:
+            server.metrics.count("errors")
+            self._error(400, str(e))
+            return
+        except Exception:
+            logger.exception("POST %s failed", self.path)
+            server.metrics.count("errors")
+            self._error(500, "internal error, see the server log")
+            return
+        if not hit:
+            server.metrics.count("rendered")
+            server.metrics.record(time.perf_counter() - start)
+        self._reply(200, body, formats[format], [("X-Cache", "hit" if hit else "miss")])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--cache-mb", type=int, default=256)
+    parser.add_argument(
+        "--unsafe-allow-remote",
+        action="store_true",
+        help="serve on non loopback hosts - requests run python code",
+    )
+    args = parser.parse_args()
+    try:
+        server = RenderServer(
+            args.host,
+            args.port,
+            args.workers,
+            args.cache_mb * 2**20,
+            allow_remote=args.unsafe_allow_remote,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if not is_loopback(args.host):
+        print(
+            f"WARNING: anyone reaching {args.host} can run code on this machine",
+            file=sys.stderr,
+        )
+    server.warm_up()
+    print(f"serving on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        server.executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
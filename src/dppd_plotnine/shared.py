@@ -1,3 +1,4 @@
+import functools
 
 many_cat_colors = [
     "#1C86EE",
@@ -25,3 +26,20 @@ many_cat_colors = [
     "#CDCD00",
     "#A52A2A",
 ]
+
+
+class stat_method:
+    """A stat's compute_panel / compute_group, for every plotnine version.
+
+    Before 0.15 these are classmethods handed the stat's params,
+    since 0.15 methods reading self.params. The wrapped function gets
+    the stat (or its class) and params - empty since 0.15,
+    so use params or self.params.
+    """
+
+    def __init__(self, func):
+        functools.update_wrapper(self, func)
+        self.func = func
+
+    def __get__(self, obj, objtype=None):
+        return functools.partial(self.func, objtype if obj is None else obj)
@@ -229,6 +229,14 @@ def layer_data(p, i=0):
     return p.layers.data[i]
 
 
+@pytest.fixture(autouse=True, scope="session")
+def palette_cache_dir(tmp_path_factory):
+    """Keep generated many_categories palettes out of ~/.cache"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("DPPD_PLOTNINE_CACHE", str(tmp_path_factory.mktemp("palettes")))
+        yield
+
+
 @pytest.fixture
 def per_test_dir(request):
     import sys
@@ -56,3 +56,66 @@ def test_invalid_orientation_raises():
         dp(mtcars).p9().theme_bw().annotation_stripes(direction="diagonal")
     dp(mtcars).p9().theme_bw().annotation_stripes(direction="vertical").pd
     dp(mtcars).p9().theme_bw().annotation_stripes(direction="horizontal").pd
+
+
+def test_annotation_stripes_dppd_single_collection():
+    from matplotlib.collections import PolyCollection
+
+    from dppd_plotnine.geoms.annotation_stripes_dppd import stripe_vertices
+
+    stripe_vertices.cache_clear()
+    plot = (
+        dp(mtcars)
+        .categorize("cyl")
+        .p9()
+        .annotation_stripes_dppd(fill=["#00FF00", "#FF0000"])
+        .add_scatter("cyl", "hp")
+        .facet_wrap("am")
+        .pd
+    )
+    fig = plot.draw()
+    for ax in fig.axes[:2]:
+        stripes = [x for x in ax.collections if isinstance(x, PolyCollection)]
+        assert len(stripes) == 1
+        assert len(stripes[0].get_paths()) == 3  # one per label
+        assert (
+            stripes[0].get_facecolors()[:, :3] == [[0, 1, 0], [1, 0, 0], [0, 1, 0]]
+        ).all()
+    # fixed scales - the second panel reuses the geometry
+    assert stripe_vertices.cache_info().hits == 1
+
+    flipped = (
+        dp(mtcars)
+        .p9()
+        .annotation_stripes_dppd(direction="horizontal", extend=(0.25, 0.75))
+        .add_scatter("cyl", "hp")
+        .coord_flip()
+        .pd
+    )
+    ax = flipped.draw().axes[0]
+    verts = ax.collections[0].get_paths()[0].vertices
+    # horizontal + coord_flip: stripes follow the drawn x axis,
+    # extend covers part of the drawn y axis
+    y_range = ax.get_ylim()
+    assert verts[:, 1].min() == pytest.approx(
+        y_range[0] + 0.25 * (y_range[1] - y_range[0])
+    )
+    assert verts[:, 1].max() == pytest.approx(
+        y_range[0] + 0.75 * (y_range[1] - y_range[0])
+    )
+
+
+def test_annotation_stripes_dppd_vertices():
+    from dppd_plotnine.geoms.annotation_stripes_dppd import stripe_vertices
+
+    verts = stripe_vertices(
+        "x", False, (4.0, 6.0, 8.0), 3, (3.0, 9.0), (0.0, 10.0), (0, 1)
+    )
+    assert verts.shape == (3, 4, 2)
+    assert list(verts[:, 0, 0]) == [3.0, 5.0, 7.0]
+    assert list(verts[:, 2, 0]) == [5.0, 7.0, 9.0]
+    assert not verts.flags.writeable
+    swapped = stripe_vertices(
+        "y", False, (4.0, 6.0, 8.0), 3, (3.0, 9.0), (0.0, 10.0), (0, 1)
+    )
+    assert (swapped == verts[:, :, ::-1]).all()
@@ -0,0 +1,411 @@
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from dppd import dppd
+from plotnine.data import mtcars
+
+import dppd_plotnine  # noqa: F401
+from dppd_plotnine import (
+    PlotTemplate,
+    RenderQueue,
+    configure_render_queue,
+    save_many,
+    save_pdf_pages,
+    wait_all,
+)
+from dppd_plotnine.batch import facet_pages
+from dppd_plotnine.dppd_plotnine import render_lock
+
+dp, X = dppd()
+
+
+def test_save_many(per_test_dir):
+    plots = [
+        (dp(mtcars).p9().add_point("mpg", "hp").pd, "a.png"),
+        (
+            dp(mtcars).p9().add_point("mpg", "cyl").render_args(dpi=50).pd,
+            "b.png",
+            {"size": "a6"},
+        ),
+        (dp(mtcars).p9().add_point("mpg", "no_such_column").pd, "c.png", {}),
+    ]
+    results = save_many(plots, jobs=2)
+    assert [r.filename for r in results] == ["a.png", "b.png", "c.png"]
+    assert results[0].error is None
+    assert results[1].error is None
+    assert "no_such_column" in results[2].error
+    assert Path("a.png").exists()
+    assert not Path("c.png").exists()
+    dp(plots[1][0]).save("expected.png", size="a6")
+    assert Path("b.png").read_bytes() == Path("expected.png").read_bytes()
+
+
+def test_save_many_failing_preparation(per_test_dir):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    from dppd_plotnine import p9_file
+
+    pyarrow.parquet.write_table(pa.Table.from_pandas(mtcars), "mtcars.parquet")
+    missing = dp(p9_file("mtcars.parquet")).add_point("mpg", "hp").pd
+    Path("mtcars.parquet").unlink()
+    ok = dp(mtcars).p9().add_point("mpg", "hp").pd
+    for jobs in (1, 2):
+        results = save_many([(missing, "a.png"), (ok, "b.png")], jobs=jobs)
+        assert "FileNotFoundError" in results[0].error
+        assert results[1].error is None
+
+
+def test_save_many_failing_parent_preparation(per_test_dir, monkeypatch):
+    import dppd_plotnine.dppd_plotnine
+
+    def fail(plot):
+        raise ValueError("no categories")
+
+    monkeypatch.setattr(dppd_plotnine.dppd_plotnine, "categorize_columns", fail)
+    failing = dp(mtcars).p9(categorize=True).add_point("mpg", "hp").pd
+    ok = dp(mtcars).p9().add_point("mpg", "hp").pd
+    for jobs in (1, 2):
+        results = save_many([(failing, "a.png"), (ok, "b.png")], jobs=jobs)
+        assert "no categories" in results[0].error
+        assert results[1].error is None
+
+
+def test_save_many_ships_pruned_plots():
+    import pickle
+
+    from dppd_plotnine.batch import _normalize_job
+
+    df = pd.DataFrame({f"c{i}": range(2000) for i in range(300)})
+    plot = dp(df).p9(prune=True).add_point("c0", "c1").pd
+    job = _normalize_job((plot, "a.png"))
+    assert list(job[0].data.columns) == ["c0", "c1"]
+    assert len(pickle.dumps(job)) * 20 < len(pickle.dumps(plot))
+    template = PlotTemplate(plot)
+    (job,) = map(_normalize_job, template.jobs([(df, "b.png")]))
+    assert list(job[0].data.columns) == ["c0", "c1"]
+
+
+def test_save_many_reads_plots_lazily(per_test_dir):
+    jobs = 2
+
+    def plots():
+        for i in range(12):
+            unfinished = i - sum(Path(f"{j}.png").exists() for j in range(i))
+            assert unfinished <= 2 * jobs + 1
+            yield dp(mtcars).p9().add_point("mpg", "hp").pd, f"{i}.png"
+
+    results = save_many(plots(), jobs=jobs)
+    assert [r.filename for r in results] == [f"{i}.png" for i in range(12)]
+    assert all(r.error is None for r in results)
+
+
+def test_save_many_in_process(per_test_dir):
+    plots = ((dp(mtcars).p9().add_point("mpg", "hp").pd, f"{i}.png") for i in range(2))
+    results = save_many(plots, jobs=1)
+    assert all(r.error is None for r in results)
+    assert Path("1.png").exists()
+
+
+def test_save_many_from_threads(per_test_dir):
+    # each call keeps its own jobs
+    columns = {"a": "hp", "b": "wt"}
+    results = {}
+
+    def save(name):
+        plots = [
+            (dp(mtcars).p9().add_point("mpg", columns[name]).pd, f"{name}{i}.png")
+            for i in range(3)
+        ]
+        results[name] = save_many(plots, jobs=2)
+
+    threads = [threading.Thread(target=save, args=(name,)) for name in columns]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for name, column in columns.items():
+        assert [r.filename for r in results[name]] == [
+            f"{name}{i}.png" for i in range(3)
+        ]
+        assert all(r.error is None for r in results[name])
+        dp(mtcars).p9().add_point("mpg", column).save(f"{name}.png")
+        assert Path(f"{name}0.png").read_bytes() == Path(f"{name}.png").read_bytes()
+
+
+def test_save_many_takes_over_rc_params(per_test_dir):
+    import matplotlib as mpl
+
+    plot = dp(mtcars).p9().add_point("mpg", "hp").render_args(dpi=50).pd
+    with mpl.rc_context({"text.antialiased": False}):
+        results = save_many([(plot, "a.png"), (plot, "b.png")], jobs=2)
+        dp(plot).save("expected.png")
+    dp(plot).save("default.png")
+    assert all(r.error is None for r in results)
+    assert Path("a.png").read_bytes() == Path("expected.png").read_bytes()
+    assert Path("a.png").read_bytes() != Path("default.png").read_bytes()
+
+
+def test_save_many_worker_dies(per_test_dir):
+    from concurrent.futures.process import BrokenProcessPool
+
+    plot = dp(mtcars).p9().add_point("mpg", "__import__('os')._exit(1)").pd
+    ok = dp(mtcars).p9().add_point("mpg", "hp").pd
+    with pytest.raises(BrokenProcessPool):
+        save_many([(ok, "a.png"), (plot, "b.png"), (ok, "c.png")], jobs=2)
+
+
+def test_save_many_unpicklable_plot(per_test_dir):
+    df = mtcars.assign(f=[lambda: 0] * len(mtcars))
+    plots = [
+        (dp(df).p9().add_point("mpg", "hp").pd, "a.png"),
+        (dp(mtcars).p9().add_point("mpg", "hp").pd, "b.png"),
+    ]
+    results = save_many(plots, jobs=2)
+    assert "pickle" in results[0].error.lower()
+    assert results[1].error is None
+    assert Path("b.png").exists()
+
+
+def test_save_async(per_test_dir):
+    configure_render_queue(workers=2)
+    futures = [
+        dp(mtcars).p9().add_point("mpg", "hp").save_async(f"{i}.png") for i in range(3)
+    ]
+    failing = dp(mtcars).p9().add_point("mpg", "no_such_column").save_async("c.png")
+    # failed before wait_all is called - still raised by it
+    assert "no_such_column" in str(failing.exception())
+    with pytest.raises(Exception, match="no_such_column"):
+        wait_all()
+    assert all(f.done() for f in futures + [failing])
+    assert all(f.result() is None for f in futures)
+    assert Path("2.png").exists()
+    assert not Path("c.png").exists()
+    assert wait_all() == []
+
+
+_rendering = threading.Event()
+_release = threading.Event()
+
+
+def _blocked(values):
+    # an aes expression that keeps its render (and render_lock) busy
+    _rendering.set()
+    _release.wait(60)
+    return values
+
+
+def test_save_many_while_save_async_renders(per_test_dir):
+    configure_render_queue(workers=1)
+    _rendering.clear()
+    _release.clear()
+    pending = dp(mtcars).p9().add_point("mpg", "_blocked(hp)").save_async("bg.png")
+    results = []
+    try:
+        assert _rendering.wait(60)  # the background render holds render_lock
+        plots = [
+            (dp(mtcars).p9().add_point("mpg", "hp").pd, f"{i}.png") for i in range(2)
+        ]
+        thread = threading.Thread(
+            target=lambda: results.extend(save_many(plots, jobs=2)), daemon=True
+        )
+        thread.start()
+        thread.join(120)
+        assert not thread.is_alive()
+    finally:
+        _release.set()
+    assert all(r.error is None for r in results)
+    assert pending.result(60) is None
+    wait_all()
+    assert Path("bg.png").exists()
+
+
+def test_render_queue_back_pressure(per_test_dir):
+    queue = RenderQueue(workers=1, max_pending=1)
+    plot = dp(mtcars).p9().add_point("mpg", "hp").pd
+    submitted = []
+
+    def submit_three():
+        for i in range(3):
+            submitted.append(queue.submit(plot, f"{i}.png"))
+
+    with render_lock:  # nothing can render
+        producer = threading.Thread(target=submit_three)
+        producer.start()
+        producer.join(1)
+        assert producer.is_alive()  # blocked on the third plot
+        assert len(submitted) == 2
+    producer.join()
+    assert len(queue.wait_all()) <= 3
+    assert all(Path(f"{i}.png").exists() for i in range(3))
+    queue.shutdown()
+
+
+def test_render_queue_processes(per_test_dir):
+    queue = RenderQueue(workers=2, processes=True)
+    try:
+        futures = [
+            queue.submit(dp(mtcars).p9().add_point("mpg", "hp").pd, f"{i}.png")
+            for i in range(2)
+        ]
+        queue.wait_all()
+        assert all(f.result() is None for f in futures)
+        assert Path("1.png").exists()
+    finally:
+        queue.shutdown()
+
+
+def test_plot_template(per_test_dir):
+    def chain(df):
+        return dp(df).p9().add_point("mpg", "hp", color="factor(cyl)").title("t").pd
+
+    template = PlotTemplate(chain(mtcars))
+    small = mtcars[mtcars.cyl == 4]
+    replayed = template(small)
+    assert replayed.data is small
+    assert template.plot.data is mtcars
+    assert replayed.layers[0] is not template.plot.layers[0]
+    dp(replayed).save("replayed.png")
+    dp(chain(small)).save("chained.png")
+    assert Path("replayed.png").read_bytes() == Path("chained.png").read_bytes()
+
+    results = template.save_many(
+        [
+            (small, "a.png"),
+            (mtcars, "b.png", {"size": "a6"}),
+            (small[["mpg"]], "c.png"),
+        ],
+        jobs=2,
+        dpi=50,
+    )
+    assert results[0].error is None
+    assert results[1].error is None
+    assert "cyl" in results[2].error
+    dp(chain(mtcars)).save("expected.png", size="a6", dpi=50)
+    assert Path("b.png").read_bytes() == Path("expected.png").read_bytes()
+    assert Path("a.png").read_bytes() != Path("b.png").read_bytes()
+
+
+def test_save_facets(per_test_dir):
+    plot = (
+        dp(mtcars)
+        .p9()
+        .add_point("mpg", "hp", color="factor(gear)")
+        .facet_wrap("carb")
+        .pd
+    )
+    pages = facet_pages(plot, 4)
+    assert [sorted(page.data["carb"].unique()) for page in pages] == [
+        [1, 2, 3, 4],
+        [6, 8],
+    ]
+    limits = [
+        {s.aesthetics[0]: s.limits for s in page.scales if s.limits is not None}
+        for page in pages
+    ]
+    assert limits[0] == limits[1]
+    assert limits[0]["color"] == (3, 4, 5)
+    assert limits[0]["x"] == (mtcars.mpg.min(), mtcars.mpg.max())
+
+    results = dp(plot).save_facets("f.png", per_page=4, jobs=2)
+    assert [r.filename for r in results] == ["f_1.png", "f_2.png"]
+    assert all(r.error is None for r in results)
+    results = dp(plot).save_facets("f_{page:03d}.png", per_page=5, jobs=1)
+    assert [r.filename for r in results] == ["f_001.png", "f_002.png"]
+    dp(plot).save_facets("f.pdf", per_page=2, size="a6")
+    assert Path("f.pdf").read_bytes().count(b"/Type /Page ") == 3
+
+    grid = dp(mtcars).p9().add_point("mpg", "hp").facet_grid("gear ~ am").pd
+    assert len(facet_pages(grid, 2)) == 2
+    with pytest.raises(TypeError):
+        facet_pages(dp(mtcars).p9().add_point("mpg", "hp").pd)
+
+
+def test_facet_pages_keeps_every_row():
+    df = mtcars.assign(kind=mtcars["carb"].where(mtcars["carb"] < 6))  # NaN level
+    plot = (
+        dp(df)
+        .p9()
+        .add_point("mpg", "hp")
+        .add_line("mpg", "hp", data=df[df["cyl"] == 4])
+        .facet_wrap("kind")
+        .pd
+    )
+    pages = facet_pages(plot, 2)
+    assert len(pages) == 3
+    rows = pd.concat([page.data for page in pages])
+    assert sorted(rows.index) == sorted(df.index)
+    for page in pages:
+        assert page.data.index.is_monotonic_increasing
+        layer_data = page.layers[1]._data
+        assert set(layer_data.index) == set(page.data.index[page.data["cyl"] == 4])
+
+
+def test_facet_pages_transformed_scale():
+    import copy
+
+    import numpy as np
+
+    plot = (
+        dp(mtcars)
+        .p9()
+        .add_point("mpg", "hp", size="wt")
+        .facet_wrap("carb")
+        .scale_y_log10()
+        .scale_size_continuous(trans="sqrt")
+        .pd
+    )
+
+    def ranges(plot):
+        built = copy.deepcopy(plot)
+        built._build()
+        size = next(s for s in built.scales if "size" in s.aesthetics)
+        return (
+            built.layout.panel_params[0].x.range,
+            built.layout.panel_params[0].y.range,
+            size.final_limits,
+        )
+
+    expected = ranges(plot)
+    pages = facet_pages(plot, 3)
+    assert len(pages) == 2
+    for page in pages:
+        assert np.allclose(ranges(page), expected)
+
+
+def test_save_pdf_pages(per_test_dir):
+    import gc
+    import re
+    import weakref
+
+    alive = []
+
+    def plots():
+        for i in range(6):
+            plot = dp(mtcars).p9().add_point("mpg", "hp").title(str(i)).pd
+            if i == 5:
+                plot = dp(plot).render_args(size="a5").pd
+            yield plot
+            gc.collect()
+            # the previous pages were dropped once written
+            assert sum(ref() is not None for ref in alive) == 0
+            alive.append(weakref.ref(plot))
+            del plot
+
+    assert save_pdf_pages(plots(), "pages.pdf") == 6
+    boxes = re.findall(
+        rb"/MediaBox \[ ?0 0 ([\d.]+) ([\d.]+) ?\]", Path("pages.pdf").read_bytes()
+    )
+    boxes = [(round(float(w) / 72, 1), round(float(h) / 72, 1)) for w, h in boxes]
+    assert boxes == [(6.4, 4.8)] * 5 + [(8.3, 5.8)]
+    save_pdf_pages([dp(mtcars).p9().add_point("mpg", "hp").pd], "a6.pdf", size="A6")
+    assert b"/MediaBox [ 0 0 295.2 417.6 ]" in Path("a6.pdf").read_bytes()
+    plot = dp(mtcars).p9().add_point("mpg", "hp").pd
+    save_pdf_pages([plot], "cm.pdf", width=10, height=15, units="cm")
+    ((width, height),) = re.findall(
+        rb"/MediaBox \[ ?0 0 ([\d.]+) ([\d.]+) ?\]", Path("cm.pdf").read_bytes()
+    )
+    # 10 x 15 cm in points
+    assert (round(float(width)), round(float(height))) == (283, 425)
@@ -3,7 +3,7 @@ import pandas as pd
 import pytest
 from dppd import dppd
 import plotnine as p9
-import dppd_plotnine  # noqa: F401
+import dppd_plotnine
 from plotnine.data import mtcars
 
 dp, X = dppd()
@@ -276,3 +276,537 @@ def test_create_doc_image():
             assert (k.category == PendingDeprecationWarning) or (
                 k.category == FutureWarning
             ) | (k.category == DeprecationWarning)
+
+
+def test_element_verbs_are_registered_lazily():
+    # other tests resolve every verb (dir()) - check a fresh interpreter
+    import subprocess
+    import sys
+
+    code = """
+import plotnine as p9
+from dppd import base, dppd
+from plotnine.data import mtcars
+import dppd_plotnine
+from dppd_plotnine import dppd_plotnine as module
+
+key = ("geom_point", p9.ggplot)
+assert module.lazy_verbs
+assert key not in dict.keys(base.verb_registry)
+dp, X = dppd()
+dp(mtcars).p9().geom_point
+assert key in dict.keys(base.verb_registry)
+assert "geom_line" in module.lazy_verbs
+"""
+    subprocess.check_call([sys.executable, "-c", code])
+
+    from dppd.base import verb_registry
+
+    from dppd_plotnine.dppd_plotnine import LazyVerbRegistry, add_funcs, lazy_verbs
+
+    assert isinstance(verb_registry, LazyVerbRegistry)
+    assert "geom_point" in dir(dp(mtcars).p9())
+    assert "add_crossbar" in dir(dp(mtcars).p9())
+    assert "syc" in dir(dp(mtcars).p9())
+    assert not lazy_verbs
+    actual = dp(mtcars).p9().add_point("mpg", "hp").syc(trans="log10").pd
+    assert isinstance(actual, p9.ggplot)
+    assert "_add_point" in add_funcs
+
+
+def test_lazy_verbs_from_threads():
+    # a fresh registry - all verbs still pending
+    import subprocess
+    import sys
+
+    code = """
+import threading
+import plotnine as p9
+from dppd import base
+import dppd_plotnine
+from dppd_plotnine import dppd_plotnine as module
+
+names = ["save_async", "save_facets"] + sorted(module.lazy_verbs)[:40]
+for name in names:
+    barrier = threading.Barrier(8)
+    found = []
+
+    def look():
+        barrier.wait()
+        found.append((name, p9.ggplot) in base.verb_registry)
+
+    threads = [threading.Thread(target=look) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert found == [True] * 8, (name, found)
+"""
+    subprocess.check_call([sys.executable, "-c", code])
+
+
+def test_unknown_verb_raises_attribute_error():
+    with pytest.raises(AttributeError):
+        dp(mtcars).p9().add_nonexisting_geom()
+
+
+def test_save_cache(per_test_dir):
+    import os
+    from pathlib import Path
+
+    plot = dp(mtcars).p9().add_point("mpg", "hp").render_args(cache=True).pd
+    plot = dp(plot).save("cached.png", dpi=50).pd
+    assert Path("cached.png.fingerprint").exists()
+    os.utime("cached.png", (0, 0))
+    dp(plot).save("cached.png", dpi=50)
+    assert Path("cached.png").stat().st_mtime == 0  # not rendered again
+    dp(plot).save("cached.png", dpi=51)
+    assert Path("cached.png").stat().st_mtime != 0
+    os.utime("cached.png", (0, 0))
+    plot2 = dp(mtcars).head(5).p9().add_point("mpg", "hp").pd
+    dp(plot2).save("cached.png", dpi=51, cache=True)
+    assert Path("cached.png").stat().st_mtime != 0
+
+
+cache_factor = 2
+
+
+def test_save_cache_environment_values(per_test_dir):
+    # module globals stay live in the plot's environment
+    import os
+    from pathlib import Path
+
+    global cache_factor
+    plot = dp(mtcars).p9().add_point("mpg", "hp * cache_factor").pd
+    dp(plot).save("cached.png", dpi=50, cache=True)
+    os.utime("cached.png", (0, 0))
+    dp(plot).save("cached.png", dpi=50, cache=True)
+    assert Path("cached.png").stat().st_mtime == 0  # not rendered again
+    cache_factor = 1000
+    dp(plot).save("cached.png", dpi=50, cache=True)
+    assert Path("cached.png").stat().st_mtime != 0
+    dp(plot).save("expected.png", dpi=50)
+    assert Path("cached.png").read_bytes() == Path("expected.png").read_bytes()
+
+
+def cache_transform(x):
+    return np.log(x)
+
+
+def test_save_cache_function_changes(per_test_dir):
+    # a helper edited (and its module reloaded) between two saves
+    import os
+    from pathlib import Path
+
+    from dppd_plotnine.fingerprint import fingerprint_plot
+
+    global cache_transform
+    plot = dp(mtcars).p9().add_point("mpg", "cache_transform(hp)").pd
+    dp(plot).save("cached.png", dpi=50, cache=True)
+    os.utime("cached.png", (0, 0))
+    dp(plot).save("cached.png", dpi=50, cache=True)
+    assert Path("cached.png").stat().st_mtime == 0  # not rendered again
+
+    def cache_transform(x):
+        return np.sqrt(x)
+
+    dp(plot).save("cached.png", dpi=50, cache=True)
+    assert Path("cached.png").stat().st_mtime != 0
+    dp(plot).save("expected.png", dpi=50)
+    assert Path("cached.png").read_bytes() == Path("expected.png").read_bytes()
+
+    # only a string constant differs
+    def labelled(unit):
+        plot = dp(mtcars).p9().add_point("mpg", "hp")
+        if unit == "kb":
+            plot = plot.scale_y_continuous(labels=lambda v: [f"{x}" + " kb" for x in v])
+        else:
+            plot = plot.scale_y_continuous(labels=lambda v: [f"{x}" + " Mb" for x in v])
+        return fingerprint_plot(plot.pd)
+
+    assert labelled("kb") == labelled("kb")
+    assert labelled("kb") != labelled("Mb")
+
+
+def test_save_cache_unhashable_column(per_test_dir):
+    from pathlib import Path
+
+    from dppd_plotnine.fingerprint import fingerprint_plot
+
+    df = mtcars.assign(tags=[["a", "b"]] * len(mtcars))
+    plot = dp(df).p9().add_point("mpg", "hp").pd
+    assert fingerprint_plot(plot) is None
+    dp(plot).save("uncached.png", dpi=50, cache=True)  # rendered, not cached
+    assert Path("uncached.png").exists()
+    assert not Path("uncached.png.fingerprint").exists()
+
+
+def test_fingerprint_dataframe():
+    from dppd_plotnine.fingerprint import fingerprint_dataframe
+
+    df = pd.DataFrame(
+        {
+            "a": [1.0, 2.0, np.nan],
+            "b": ["x", "y", "z"],
+            "c": pd.Categorical(list("xyx")),
+        }
+    )
+    assert fingerprint_dataframe(df) == fingerprint_dataframe(df.copy())
+    df2 = df.copy()
+    df2.loc[2, "b"] = "w"
+    assert fingerprint_dataframe(df) != fingerprint_dataframe(df2)
+    assert fingerprint_dataframe(df) != fingerprint_dataframe(df[["b", "a", "c"]])
+
+
+def test_fingerprint_plot_is_stable_between_processes():
+    import subprocess
+    import sys
+    import threading
+
+    from dppd_plotnine.fingerprint import fingerprint_plot
+
+    code = """
+import numpy as np
+from dppd import dppd
+from plotnine.data import mtcars
+import dppd_plotnine
+from dppd_plotnine.fingerprint import fingerprint_plot
+
+dp, X = dppd()
+noise = np.random.random(100)  # in the facet's environment
+plot = (
+    dp(mtcars).p9().add_point("mpg", "hp").facet_wrap("cyl")
+    .scale_y_log10().theme_bw().pd
+)
+print(fingerprint_plot(plot, dpi=50))
+"""
+    fingerprints = {
+        subprocess.check_output([sys.executable, "-c", code], text=True)
+        for _ in range(2)
+    }
+    assert len(fingerprints) == 1
+    # no stable state - no fingerprint, always rendered
+    plot = dp(mtcars).p9().add_point("mpg", "hp").pd
+    assert fingerprint_plot(plot, lock=threading.Lock()) is None
+
+
+def test_decimate_points():
+    from dppd_plotnine.geoms.geom_point_decimated import decimate_points
+
+    rng = np.random.default_rng(500)
+    df = pd.DataFrame(
+        {
+            "x": rng.normal(size=10000),
+            "y": rng.normal(size=10000),
+            "color": rng.choice(["red", "blue"], 10000),
+        }
+    )
+    df.loc[5, "x"] = 100  # an outlier
+    df.loc[6, "y"] = np.nan
+    actual = decimate_points(df, 50)
+    assert len(actual) < 50 * 50 * 2 + 5
+    assert 5 in actual.index
+    assert 6 in actual.index
+    assert df["y"].idxmin() in actual.index
+    assert df["y"].idxmax() in actual.index
+    assert (actual.index == sorted(actual.index)).all()
+    assert set(actual["color"]) == {"red", "blue"}
+
+
+def test_decimate_points_with_inf():
+    from dppd_plotnine.geoms.geom_point_decimated import decimate_points
+
+    rng = np.random.default_rng(500)
+    df = pd.DataFrame({"x": rng.normal(size=10000), "y": rng.normal(size=10000)})
+    expected = decimate_points(df, 50)
+    df.loc[7, "x"] = np.inf
+    df.loc[8, "y"] = -np.inf
+    actual = decimate_points(df, 50)
+    # the finite points are binned as before, the infs kept on top
+    assert set(actual.index) - {7, 8} == set(expected.index) - {7, 8}
+    assert {7, 8} <= set(actual.index)
+
+
+def test_add_point_max_points():
+    rng = np.random.default_rng(500)
+    df = pd.DataFrame({"x": rng.normal(size=20000), "y": rng.normal(size=20000)})
+    plot = dp(df).p9().add_point("x", "y", _max_points=1000).figure_size(1, 1).pd
+    assert isinstance(plot.layers[0].geom, dppd_plotnine.geoms.geom_point_decimated)
+    fig = plot.draw()
+    offsets = fig.axes[0].collections[0].get_offsets()
+    assert len(offsets) < 20000
+    plot = dp(df).p9().add_point("x", "y", _max_points=50000).figure_size(1, 1).pd
+    fig = plot.draw()
+    assert len(fig.axes[0].collections[0].get_offsets()) == 20000
+
+
+def test_add_arg_spec():
+    from dppd_plotnine.dppd_plotnine import add_arg_spec, add_funcs, split_add_args
+
+    spec = add_arg_spec(p9.geom_crossbar)
+    assert spec is add_arg_spec(p9.geom_crossbar)
+    assert spec.positional == ("x", "y", "ymax", "ymin")
+    assert spec.underscored == ("_x", "_y", "_ymax", "_ymin")
+    assert callable(dp(mtcars).p9().add_crossbar)  # registered on first use
+    assert add_funcs["add_crossbar"].arg_spec == spec
+
+    mapped, non_mapped, other = split_add_args(
+        add_arg_spec(p9.geom_point),
+        ("mpg", "hp"),
+        {"color": "cyl", "_size": 2, "stat": "identity", "DEFAULT_AES": {}},
+    )
+    assert mapped == {"x": "mpg", "y": "hp", "color": "cyl"}
+    assert non_mapped == {"size": 2, "stat": "identity"}
+    assert other == {"DEFAULT_AES": {}}
+    with pytest.raises(ValueError):
+        split_add_args(spec, ("a",), {"_x": "b"})
+    with pytest.raises(ValueError):
+        split_add_args(spec, ("a", "b", "c", "d", "e"), {})
+
+
+def test_referenced_columns():
+    from dppd_plotnine.dppd_plotnine import referenced_columns
+
+    wide = mtcars.assign(**{"my col": 1})
+    plot = (
+        dp(wide)
+        .p9(p9.aes(color="factor(gear)"))
+        .add_point("mpg", "np.log(hp)", fill=p9.after_stat("count"))
+        .add_bar("mpg", "my col")
+        .add_point("x", "y", data=pd.DataFrame({"x": [1], "y": [1], "wt": [1]}))
+        .facet_grid("cyl ~ am")
+        .pd
+    )
+    assert referenced_columns(plot) == ["mpg", "cyl", "hp", "am", "gear", "my col"]
+    plot = dp(wide).p9().add_point("mpg", "hp", data=lambda df: df).pd
+    assert referenced_columns(plot) is None
+
+
+def test_prune_columns(per_test_dir, monkeypatch):
+    from pathlib import Path
+
+    plot = dp(mtcars).p9().add_point("mpg", "hp").pd
+    pruned = dp(plot).prune_columns().pd
+    assert list(pruned.data.columns) == ["mpg", "hp"]
+    assert len(plot.data.columns) == len(mtcars.columns)
+
+    plot = dp(mtcars).p9(prune=True).add_point("mpg", "hp").pd
+    assert len(plot.data.columns) == len(mtcars.columns)  # pruned on render
+    saved = []
+    with monkeypatch.context() as m:
+        m.setattr(p9.ggplot, "save", lambda self, *args, **kwargs: saved.append(self))
+        dp(plot).save("test.png")
+    assert list(saved[0].data.columns) == ["mpg", "hp"]
+    dp(plot).save("test.png", cache=True)
+    assert Path("test.png").exists()
+
+
+def test_categorize_columns():
+    df = mtcars.assign(gear=mtcars["gear"].astype(str), carb=mtcars["carb"].astype(str))
+    plot = (
+        dp(df)
+        .p9(categorize=True)
+        .add_point("mpg", "hp", color="gear", shape="carb + 'x'")
+        .facet_wrap("name")
+        .pd
+    )
+    assert not isinstance(plot.data["gear"].dtype, pd.CategoricalDtype)
+    actual = dp(plot).categorize_columns().pd
+    for column in ["gear", "name"]:
+        assert isinstance(actual.data[column].dtype, pd.CategoricalDtype)
+        assert list(actual.data[column].cat.categories) == sorted(df[column].unique())
+    assert not isinstance(actual.data["carb"].dtype, pd.CategoricalDtype)
+    assert actual.data["mpg"].dtype == df["mpg"].dtype
+    assert not hasattr(actual, "categorize_columns")
+    assert df["gear"].dtype != "category"
+
+
+def test_save_profile(per_test_dir, caplog):
+    import logging
+    from pathlib import Path
+
+    plot = (
+        dp(mtcars)
+        .p9()
+        .add_point("mpg", "hp")
+        .add_smooth("mpg", "hp", _method="lm")
+        .facet_wrap("am")
+        .pd
+    )
+    dp(plot).save("plain.png")
+    assert not hasattr(plot, "render_timings")
+    with caplog.at_level(logging.INFO, logger="dppd_plotnine.profiling"):
+        dp(plot).save("profiled.png", profile=True)
+    assert Path("profiled.png").exists()
+    timings = plot.render_timings
+    assert [layer["geom"] for layer in timings["layers"]] == [
+        "geom_point",
+        "geom_smooth",
+    ]
+    assert timings["layers"][1]["stat"] == "stat_smooth"
+    for step in ["compute_aesthetics", "compute_statistic", "compute_position", "draw"]:
+        assert step in timings["steps"]
+        assert step in timings["layers"][0]
+    for phase in ["build", "draw_layers", "encode"]:
+        assert timings["phases"][phase] > 0
+    assert abs(sum(timings["phases"].values()) - timings["total"]) < 1e-6
+    assert caplog.records[-1].render_timings is timings
+
+
+def test_save_reuse_figure(per_test_dir):
+    from pathlib import Path
+
+    from dppd_plotnine.figure_pool import pooling, renderer_pool
+
+    plots = [
+        dp(mtcars).p9().add_point("mpg", "hp", color="factor(cyl)").facet_wrap("am").pd,
+        dp(mtcars).p9().add_bar("cyl", "hp").theme_bw().title("bw").pd
+        + p9.theme(plot_background=p9.element_rect(fill="red")),
+        dp(mtcars).p9().add_line("mpg", "hp").pd,
+        dp(mtcars).p9().add_point("mpg", "hp", fill="wt").render_args(dpi=50).pd,
+    ]
+    renderer_pool.clear()
+    reused = renderer_pool.reused
+    for repeat in range(2):
+        for i, plot in enumerate(plots):
+            for suffix, kwargs in (
+                (".png", {}),
+                (".pdf", {"metadata": {"CreationDate": None}}),
+            ):
+                dp(plot).save(f"plain{suffix}", **kwargs)
+                dp(plot).save(f"pooled{suffix}", reuse_figure=True, **kwargs)
+                assert (
+                    Path(f"plain{suffix}").read_bytes()
+                    == Path(f"pooled{suffix}").read_bytes()
+                ), (i, suffix)
+    # two sizes - on plotnine < 0.15 a plain save
+    assert renderer_pool.reused - reused == (2 * len(plots) - 2 if pooling else 0)
+
+
+def test_render_bytes(per_test_dir):
+    import io
+    from pathlib import Path
+
+    from test_extensions import get_image_info
+
+    plot = dp(mtcars).p9().add_point("mpg", "hp").render_args(dpi=50).pd
+    png = dp(plot).render_bytes()
+    dp(plot).save("on_disk.png")
+    assert png == Path("on_disk.png").read_bytes()
+    assert get_image_info(png) == (320, 240)
+    dp(plot).save("a6.png", size="a6")
+    assert dp(plot).render_bytes(size="a6") == Path("a6.png").read_bytes()
+    assert dp(plot).render_bytes("svg").lstrip().startswith(b"<?xml")
+    assert dp(plot).render_bytes("pdf").startswith(b"%PDF")
+    stream = io.BytesIO()
+    assert dp(plot).render_bytes("png", buffer=stream) is stream
+    assert stream.getvalue() == png
+    with pytest.raises(ValueError):
+        dp(plot).render_bytes(cache=True)
+    assert dp(plot).render_args(dpi=50, cache=True).render_bytes() == png
+
+
+def test_p9_arrow_and_polars(per_test_dir, monkeypatch):
+    pa = pytest.importorskip("pyarrow")
+    df = mtcars.assign(gear=mtcars["gear"].astype(str))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    factor = 2  # noqa: F841 - read by the "hp * factor" aes
+    plot = dp(table).p9().add_point("mpg", "hp * factor", color="gear").pd
+    assert isinstance(plot.data["hp"].dtype, pd.ArrowDtype)
+    # the columns wrap the table's buffers
+    assert (
+        plot.data["hp"].array._pa_array.chunk(0).buffers()[1].address
+        == table.column("hp").chunk(0).buffers()[1].address
+    )
+    assert plot.prune_columns
+    saved = []
+    with monkeypatch.context() as m:
+        m.setattr(p9.ggplot, "save", lambda self, *args, **kwargs: saved.append(self))
+        dp(plot).save("test.png")
+    assert list(saved[0].data.columns) == ["mpg", "hp", "gear"]
+    png = dp(plot).render_args(dpi=50).render_bytes()
+    expected = dp(df).p9().add_point("mpg", "hp * factor", color="gear")
+    assert png == expected.render_args(dpi=50).render_bytes()
+
+    pl = pytest.importorskip("polars")
+    plot = dp(pl.from_pandas(df)).p9().add_point("mpg", "hp * factor", color="gear")
+    assert plot.render_args(dpi=50).render_bytes() == png
+
+
+def test_import_does_not_import_heavy_modules():
+    # plotnine imports matplotlib lazily, and so do we
+    # (plotnine >= 0.15 imports concurrent.futures itself)
+    import subprocess
+    import sys
+
+    code = (
+        "import sys, plotnine, dppd, pandas; "
+        "before = set(sys.modules); "
+        "import dppd_plotnine; "
+        "heavy = {'polars', 'matplotlib', 'multiprocessing', 'concurrent.futures'}"
+        " & (set(sys.modules) - before); "
+        "assert not heavy, heavy"
+    )
+    subprocess.check_call([sys.executable, "-c", code])
+
+
+def test_lazy_exports():
+    # batch & co. are imported on first use - as attribute or verb
+    import subprocess
+    import sys
+
+    code = (
+        "import sys, dppd_plotnine; "
+        "from dppd import dppd; "
+        "from plotnine.data import mtcars; "
+        "dp, X = dppd(); "
+        "assert dp(mtcars).p9().save_async; "
+        "assert 'dppd_plotnine.batch' in sys.modules; "
+        "from dppd_plotnine import p9_file, save_many; "
+        "assert save_many is dppd_plotnine.batch.save_many; "
+        "assert 'RenderQueue' in dir(dppd_plotnine)"
+    )
+    subprocess.check_call([sys.executable, "-c", code])
+    with pytest.raises(AttributeError):
+        dppd_plotnine.no_such_name
+
+
+def test_p9_file(per_test_dir):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    from dppd_plotnine import p9_file
+
+    df = mtcars.assign(gear=mtcars["gear"].astype(str))
+    pyarrow.parquet.write_table(pa.Table.from_pandas(df), "mtcars.parquet")
+    pyarrow.feather.write_feather(df, "mtcars.arrow", compression="uncompressed")
+    expected = (
+        dp(df)
+        .p9()
+        .add_point("mpg", "hp * 2", color="gear")
+        .facet_wrap("am")
+        .render_args(dpi=50)
+        .render_bytes()
+    )
+    for filename in ["mtcars.parquet", "mtcars.arrow"]:
+        plot = (
+            dp(p9_file(filename))
+            .add_point("mpg", "hp * 2", color="gear")
+            .facet_wrap("am")
+            .render_args(dpi=50)
+            .pd
+        )
+        assert len(plot.data) == 0
+        assert list(plot.data.columns) == list(df.columns)
+        loaded = dp(plot).load_columns().pd
+        assert list(loaded.data.columns) == ["mpg", "hp", "am", "gear"]
+        assert len(loaded.data) == len(df)
+        assert not hasattr(loaded, "column_source")
+        assert dp(plot).render_bytes() == expected
+        # the file is read again on every save
+        assert hasattr(plot, "column_source")
+    plot = dp(p9_file("mtcars.parquet")).add_cummulative("hp", percentile=0.9).pd
+    assert "extreme was 335.00" in plot.labels.title
+    with pytest.raises(ValueError):
+        p9_file("mtcars.csv")
@@ -1,8 +1,11 @@
-from dppd import dppd
+import json
+
 import plotnine as p9
-import dppd_plotnine  # noqa: F401
+from dppd import dppd
 from plotnine.data import mtcars
 
+import dppd_plotnine  # noqa: F401
+
 dp, X = dppd()
 
 
@@ -72,6 +75,26 @@ def test_scale_fill_many_categories():
     assert actual == "test_scale_fill_many_categories"
 
 
+def test_scale_manual_lookup_matches_plotnine():
+    import numpy as np
+    import pandas as pd
+
+    from dppd_plotnine.plotnine_extensions import scale_color_manual_lookup
+
+    values = pd.Series(["b", "a", None, "c", "zz", "a"])
+    colors = ["#ff0000", "#00ff00", "#0000ff"]
+    for x in [values, values.astype("category")]:
+        for na_translate in [True, False]:
+            expected = p9.scale_color_manual(colors, na_translate=na_translate)
+            actual = scale_color_manual_lookup(colors, na_translate=na_translate)
+            for scale in expected, actual:
+                scale.train(pd.Series(["a", "b", "c"]))
+            assert actual.map(x) == list(np.array(expected.map(x), dtype=object)), (
+                x.dtype,
+                na_translate,
+            )
+
+
 def test_scale_color_many_categories():
     actual = (
         dp(mtcars)
@@ -85,6 +108,56 @@ def test_scale_color_many_categories():
     assert actual == "test_scale_color_many_categories"
 
 
+def test_many_categories(tmp_path, monkeypatch):
+    from dppd_plotnine import many_cat_colors, many_categories
+    from dppd_plotnine.palettes import _generated_colors, _hex_to_rgb, rgb_to_lab
+
+    monkeypatch.setenv("DPPD_PLOTNINE_CACHE", str(tmp_path))
+    _generated_colors.cache_clear()
+    # the hand picked colors, without the duplicate #0000FF
+    hand_picked = list(dict.fromkeys(many_cat_colors))
+    assert len(hand_picked) == 23
+    assert many_categories(3) == many_cat_colors[:3]
+    assert many_categories(23) == hand_picked
+    assert many_categories(24)[:23] == hand_picked
+    assert many_categories(23, offset=2) == hand_picked[2:] + hand_picked[:2]
+    assert many_categories(23, offset=25) == many_categories(23, offset=2)
+    assert many_categories(30, offset=2)[23:] == many_categories(30)[23:]
+    for n in (11, 18, 20, 24):
+        assert len(set(many_categories(n))) == n
+        assert len(set(many_categories(n, offset=5))) == n
+    colors = many_categories(200)
+    assert len(set(colors)) == 200
+    assert colors[:23] == hand_picked
+    assert colors[:50] == many_categories(50)  # the sequence only grows
+    assert many_categories(50, seed=1)[-27:] != colors[23:50]
+    lab = rgb_to_lab(_hex_to_rgb(colors))
+    assert ((lab[23:] - rgb_to_lab([[1, 1, 1]])) ** 2).sum(axis=1).min() > 5**2
+    # from the disk cache, once out of memory
+    cache_file = tmp_path / "many_categories_v2_177_0.json"
+    assert cache_file.exists()
+    _generated_colors.cache_clear()
+    cache_file.write_text(json.dumps(colors[23:][::-1]))
+    assert many_categories(200)[23:] == colors[23:][::-1]
+    # truncated or corrupt caches are regenerated and rewritten
+    for corrupt in ['["#123456"]', '["#123456", 1', json.dumps(["red"] * 177)]:
+        _generated_colors.cache_clear()
+        cache_file.write_text(corrupt)
+        assert many_categories(200) == colors
+        assert json.loads(cache_file.read_text()) == colors[23:]
+    _generated_colors.cache_clear()
+
+
+def test_scale_color_many_categories_beyond_hand_picked():
+    import pandas as pd
+
+    df = pd.DataFrame({"x": range(60), "group": [f"g{i:02}" for i in range(60)]})
+    plot = dp(df).p9().add_point("x", "x", color="group").scale_color_many_categories()
+    scale = plot.pd.scales[0]
+    scale.train(df["group"])
+    assert len(set(scale.map(df["group"]))) == 60
+
+
 def test_turn_x_axis_labels():
     actual = (dp(mtcars).head(1).p9().add_point("mpg", "hp").turn_x_axis_labels()).pd
     assert actual == "test_turn_x_axis_labels"
@@ -147,3 +220,127 @@ def test_save_size(per_test_dir):
     info = get_image_info(open("test.png", "rb").read())
     assert info[1] == 1755
     assert info[0] == 1245
+
+
+def test_cummulative_curve():
+    import numpy as np
+
+    from dppd_plotnine.plotnine_extensions import cummulative_curve
+
+    values = np.array([3, 1, 2, 2, np.nan, 5])
+    x, y = cummulative_curve(values)
+    assert list(x) == [1, 2, 3, 5]
+    assert list(y) == [5, 4, 2, 1]  # number of values >= x
+    x, y = cummulative_curve(values, ascending=False)
+    assert list(y) == [1, 3, 4, 5]  # number of values <= x
+    x, y = cummulative_curve(values, percent=True)
+    assert list(y) == [100, 80, 40, 20]
+    x, y = cummulative_curve(values, percentile=0.6)
+    assert list(x) == [1, 2]
+    assert list(y) == [5, 4]
+    x, y = cummulative_curve(values, percentile=-0.4)
+    assert list(x) == [3, 5]
+
+
+def test_add_cummulative_per_group_and_panel():
+    from conftest import layer_data
+
+    plot = (
+        dp(mtcars)
+        .categorize("cyl")
+        .p9()
+        .add_cummulative("hp", color="cyl", percent=True, percentile=0.75)
+        .facet_wrap("am")
+        .pd
+    )
+    data = layer_data(plot)
+    assert data.groupby(["PANEL", "group"]).size().shape[0] == 6
+    assert data.groupby(["PANEL", "group"])["y"].max().eq(100).all()
+    assert plot.labels.y == "% >="
+    plot.draw_test()
+
+
+def test_add_cummulative_label_matches_curve():
+    from conftest import layer_data
+
+    plot = dp(mtcars).p9().add_cummulative("hp", _size=2).pd
+    data = layer_data(plot)
+    assert plot.labels.y == "# >="
+    assert data["y"].iloc[0] == len(mtcars)  # all values >= the smallest
+    assert (data["size"] == 2).all()
+    plot = dp(mtcars).p9().add_cummulative("hp", ascending=False).pd
+    data = layer_data(plot)
+    assert plot.labels.y == "# <="
+    assert data["y"].iloc[-1] == len(mtcars)  # all values <= the largest
+
+
+def test_cyberpunk_glow_decimated_and_downsampled():
+    import numpy as np
+    import pandas as pd
+
+    from dppd_plotnine.geoms import (
+        geom_line_downsampled_glow,
+        geom_point_decimated_glow,
+    )
+
+    x = np.linspace(0, 100, 50000)
+    df = pd.DataFrame({"x": x, "y": np.sin(x)})
+    for plot, cls in [
+        (
+            dp(df).p9().cyberpunk().add_point("x", "y", _max_points=100),
+            geom_point_decimated_glow,
+        ),
+        (
+            dp(df).p9().cyberpunk().add_line("x", "y", _downsample="minmax"),
+            geom_line_downsampled_glow,
+        ),
+    ]:
+        plot = plot.render_args(width=2, height=2, dpi=50).pd
+        assert len(plot.layers) == 1
+        assert isinstance(plot.layers[0].geom, cls)
+        ax = plot.draw().axes[0]
+        drawn = [len(c.get_offsets()) for c in ax.collections]
+        drawn += [len(line.get_xdata()) for line in ax.lines]
+        assert len(drawn) >= 2  # glow strokes and the geom itself
+        assert max(drawn) < len(df)  # thinned once, for all strokes
+
+
+def test_cyberpunk_glow_is_one_layer():
+    from dppd_plotnine.geoms import geom_line_glow
+
+    df = mtcars.assign(cyl=mtcars["cyl"].astype(str))
+    plot = dp(df).p9().cyberpunk().add_line("mpg", "hp", color="cyl").pd
+    assert len(plot.layers) == 1
+    assert isinstance(plot.layers[0].geom, geom_line_glow)
+
+    # looks like the glow layers stacked beneath the plain one
+    stacked = (
+        dp(df)
+        .p9()
+        .theme_cyberpunk()
+        .scale_color_cyberpunk()
+        .scale_fill_cyberpunk()
+        ._add_boxplot(
+            "cyl",
+            y="hp",
+            _fill=None,
+            _size=3,
+            _alpha=0.1,
+            _outlier_size=4.5,
+            _outlier_alpha=0.1,
+        )
+        ._add_boxplot(
+            "cyl", y="hp", _fill=None, _outlier_size=1.5, DEFAULT_AES={"color": "white"}
+        )
+        .render_args(dpi=50)
+        .render_bytes()
+    )
+    glowing = (
+        dp(df)
+        .p9()
+        .cyberpunk()
+        .add_boxplot("cyl", y="hp")
+        .render_args(dpi=50)
+        .render_bytes()
+    )
+    assert glowing == stacked
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+import plotnine as p9
+from conftest import layer_data
+from dppd import dppd
+from matplotlib.collections import PolyCollection
+
+import dppd_plotnine  # noqa: F401
+from dppd_plotnine.geoms.geom_bin2d_fast import hex_bins, rect_bins
+from dppd_plotnine.geoms.geom_path_downsampled import downsample_lines, lttb_indices
+
+dp, X = dppd()
+
+rng = np.random.default_rng(500)
+df = pd.DataFrame(
+    {
+        "x": rng.normal(size=5000),
+        "y": rng.normal(size=5000),
+        "f": rng.choice(["a", "b"], 5000),
+    }
+)
+
+
+def test_rect_bins():
+    counts, x, y, sx, sy = rect_bins(
+        np.array([0.1, 0.1, 0.9, 1.0]),
+        np.array([0.1, 0.2, 0.9, 1.0]),
+        None,
+        (2, 2),
+        (0, 1),
+        (0, 1),
+    )
+    assert sx == sy == 0.5
+    assert list(counts) == [2, 0, 0, 2]
+    assert list(x) == [0.25, 0.25, 0.75, 0.75]
+    assert list(y) == [0.25, 0.75, 0.25, 0.75]
+
+
+def test_hex_bins_assign_to_nearest_center():
+    x = rng.uniform(0, 1, 1000)
+    y = rng.uniform(0, 1, 1000)
+    counts, cx, cy, sx, sy = hex_bins(x, y, None, (5, 5), (0, 1), (0, 1))
+    assert counts.sum() == 1000
+    # every point went to the center closest in hexagon metric
+    d = (x[:, None] - cx[None]) ** 2 / sx**2 + 3 * (y[:, None] - cy[None]) ** 2 / sy**2
+    expected = np.bincount(np.argmin(d, axis=1), minlength=len(counts))
+    assert (expected == counts).all()
+
+
+def test_add_bin2d_fast():
+    plot = dp(df).p9().add_bin2d_fast("x", "y", _bins=10).pd
+    data = layer_data(plot)
+    assert data["count"].sum() == len(df)
+    assert len(data) <= 100
+    widths = data["xmax"] - data["xmin"]
+    assert np.allclose(widths, widths.iloc[0])
+    plot.draw_test()
+
+
+def test_add_hexbin_facets_share_grid():
+    plot = (
+        dp(df)
+        .p9()
+        .add_hexbin("x", "y", _bins=10)
+        .facet_wrap("f")
+        .scale_fill_continuous(trans="log10")
+        .pd
+    )
+    data = layer_data(plot)
+    assert data["count"].sum() == len(df)
+    assert set(data["PANEL"]) == {1, 2}
+    centers = data.groupby("PANEL")["x"].apply(lambda x: set(np.round(x, 8)))
+    assert len(centers[1] & centers[2]) > 10
+    plot.draw_test()
+
+
+def test_hexbin_single_collection_per_panel():
+    fig = dp(df).p9().add_hexbin("x", "y", _bins=10).facet_wrap("f").pd.draw()
+    for ax in fig.axes[:2]:
+        assert len(ax.collections) == 1
+        assert isinstance(ax.collections[0], PolyCollection)
+    assert isinstance(dp(df).p9().geom_hexbin(p9.aes("x", "y")).pd, p9.ggplot)
+
+
+def _series(n=100000, groups=2):
+    walk = pd.DataFrame(
+        {
+            "x": np.tile(np.arange(n // groups, dtype=float), groups),
+            "y": np.cumsum(rng.normal(size=n)),
+            "group": np.repeat(np.arange(groups), n // groups),
+        }
+    )
+    walk.loc[1234, "y"] = 1e6  # a single spike
+    return walk
+
+
+def test_downsample_minmax_keeps_extremes():
+    walk = _series()
+    small = downsample_lines(walk, 100, "minmax", (0, 50000))
+    assert len(small) <= 2 * 4 * 100
+    for column in ["x", "y"]:
+        assert (
+            small.groupby("group")[column].agg(["min", "max"])
+            == walk.groupby("group")[column].agg(["min", "max"])
+        ).all(axis=None)
+    # still in drawing order per group
+    assert (small.groupby("group")["x"].diff().dropna() > 0).all()
+
+
+def test_downsample_minmax_keeps_line_breaks():
+    walk = _series(groups=1)
+    walk.loc[5000, "y"] = np.nan
+    small = downsample_lines(walk, 10, "minmax")
+    assert small["y"].isna().sum() == 1
+    assert 4999 in small.index and 5001 in small.index
+
+
+def test_lttb_indices():
+    y = np.array([0, 1, 0, 5, 0, 1, 0, 1, 0, 0.0])
+    assert list(lttb_indices(np.arange(10.0), y, 4)) == [0, 3, 6, 9]
+    assert list(lttb_indices(np.arange(3.0), y[:3], 10)) == [0, 1, 2]
+    walk = _series()
+    small = downsample_lines(walk, 100, "lttb", (0, 50000))
+    assert len(small) == 2 * 2 * 100
+    assert small["y"].max() == 1e6
+
+
+def test_lttb_with_line_breaks():
+    walk = _series(groups=1)
+    walk.loc[5000, "y"] = np.nan
+    small = downsample_lines(walk, 100, "lttb", (0, 50000))
+    assert len(small) <= 2 * 100 + 3  # still downsampled
+    assert small["y"].isna().sum() == 1
+    assert {0, 4999, 5001, len(walk) - 1} <= set(small.index)
+    assert (small.index == sorted(small.index)).all()
+
+
+def test_add_line_downsample():
+    walk = _series().assign(group=lambda df: df["group"].astype(str))
+    for verb in ["add_line", "add_step", "add_path"]:
+        for method in ["minmax", "lttb"]:
+            plot = (
+                getattr(dp(walk).p9(), verb)(
+                    "x", "y", color="group", _downsample=method
+                )
+                .figure_size(1, 1)
+                .pd
+            )
+            assert plot.layers[0].geom.params["downsample"] == method
+            ax = plot.draw().axes[0]
+            vertices = sum(len(line.get_xydata()) for line in ax.lines) + sum(
+                len(path.vertices)
+                for collection in ax.collections
+                for path in collection.get_paths()
+            )
+            assert vertices < 20000, (verb, method)
+    plot = dp(walk).p9().add_line("x", "y", color="group").pd
+    assert type(plot.layers[0].geom) is p9.geom_line
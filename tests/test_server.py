@@ -0,0 +1,147 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+from plotnine.data import mtcars
+
+from dppd_plotnine.server import RenderError, RenderServer, is_loopback, parse_chain
+
+
+def post(server, chain, data, format="png", content_type="text/csv"):
+    request = urllib.request.Request(
+        f"{server.url}/render?format={format}",
+        data=data,
+        headers={"Content-Type": content_type, "X-Dppd-Chain": json.dumps(chain)},
+    )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return response.headers, response.read()
+
+
+def test_parse_chain():
+    assert parse_chain('[["add_point", ["x", "y"]], "theme_bw"]') == [
+        ("p9", [], {}),
+        ("add_point", ["x", "y"], {}),
+        ("theme_bw", [], {}),
+    ]
+    with pytest.raises(RenderError):
+        parse_chain("{")
+    with pytest.raises(RenderError):
+        parse_chain('[["add_point", "x"]]')
+
+
+def test_render_server():
+    csv = mtcars.to_csv(index=False).encode("utf-8")
+    chain = [
+        ["p9", [], {"prune": True}],
+        ["add_point", ["mpg", "hp"], {"color": "factor(cyl)"}],
+        ["render_args", [], {"dpi": 50}],
+    ]
+    with RenderServer(workers=1) as server:
+        headers, png = post(server, chain, csv)
+        assert png.startswith(b"\x89PNG")
+        assert headers["X-Cache"] == "miss"
+        headers, again = post(server, chain, csv)
+        assert headers["X-Cache"] == "hit"
+        assert again == png
+        headers, svg = post(server, chain, csv, format="svg")
+        assert headers["Content-Type"] == "image/svg+xml"
+        assert b"<svg" in svg
+
+        for bad_chain in [
+            [["save", ["x.png"]]],
+            [["to_csv", ["x.csv"]]],
+            [["add_point", ["mpg", "no_such_column"]]],
+        ]:
+            with pytest.raises(urllib.error.HTTPError) as e:
+                post(server, bad_chain, csv)
+            assert e.value.code == 400
+            assert b"Traceback" not in e.value.read()
+        with pytest.raises(urllib.error.HTTPError) as e:
+            post(server, chain, csv, content_type="text/plain")
+        assert e.value.code == 400
+
+        with urllib.request.urlopen(f"{server.url}/metrics", timeout=10) as response:
+            metrics = json.loads(response.read())
+        assert metrics["counts"]["requests"] == 7
+        assert metrics["counts"]["cache_hits"] == 1
+        assert metrics["counts"]["rendered"] == 2
+        assert metrics["counts"]["errors"] == 4
+        assert metrics["latency"]["max"] > 0
+        assert metrics["cache"]["entries"] == 2
+
+
+def test_render_server_refuses_remote_hosts():
+    assert is_loopback("127.0.0.1")
+    assert is_loopback("::1")
+    assert is_loopback("localhost")
+    assert not is_loopback("0.0.0.0")
+    assert not is_loopback("")
+    with pytest.raises(ValueError, match="allow_remote"):
+        RenderServer(host="0.0.0.0")
+
+
+def test_render_server_refuses_foreign_hosts_and_origins():
+    csv = mtcars.to_csv(index=False).encode("utf-8")
+    chain = [["add_point", ["mpg", "hp"]], ["render_args", [], {"dpi": 50}]]
+    with RenderServer(workers=1) as server:
+        port = server.httpd.server_address[1]
+        for headers in [
+            {"Host": f"attacker.example:{port}"},  # DNS rebinding
+            {"Host": "127.0.0.1:1"},
+            {"Origin": "http://attacker.example"},
+            {"Origin": f"http://localhost:{port}"},  # not the Host it sent
+        ]:
+            request = urllib.request.Request(
+                f"{server.url}/render",
+                data=csv,
+                headers={"X-Dppd-Chain": json.dumps(chain), **headers},
+            )
+            with pytest.raises(urllib.error.HTTPError) as e:
+                urllib.request.urlopen(request, timeout=10)
+            assert e.value.code == 403, headers
+        assert server.metrics.counts["refused"] == 4
+        assert server.metrics.counts["requests"] == 0
+        request = urllib.request.Request(
+            f"{server.url}/render",
+            data=csv,
+            headers={
+                "Content-Type": "text/csv",
+                "X-Dppd-Chain": json.dumps(chain),
+                "Origin": server.url,
+            },
+        )
+        with urllib.request.urlopen(request, timeout=60) as response:
+            assert response.read().startswith(b"\x89PNG")
+        request = urllib.request.Request(
+            f"http://localhost:{port}/health", headers={"Host": f"localhost:{port}"}
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            assert response.read() == b"ok"
+
+
+def test_render_server_replaces_dead_workers():
+    csv = mtcars.to_csv(index=False).encode("utf-8")
+    with RenderServer(workers=1) as server:
+        with pytest.raises(urllib.error.HTTPError) as e:
+            post(server, [["add_point", ["mpg", "__import__('os')._exit(1)"]]], csv)
+        assert e.value.code == 400
+        assert b"worker died" in e.value.read()
+        _, png = post(server, [["add_point", ["mpg", "hp"]]], csv)
+        assert png.startswith(b"\x89PNG")
+        assert server.metrics.counts["worker_restarts"] == 1
+
+
+def test_render_server_internal_errors(caplog):
+    def broken(*args):
+        raise KeyError("internal")
+
+    csv = mtcars.to_csv(index=False).encode("utf-8")
+    with RenderServer(workers=1) as server:
+        server.render = broken
+        with pytest.raises(urllib.error.HTTPError) as e:
+            post(server, [["add_point", ["mpg", "hp"]]], csv)
+        assert e.value.code == 500
+        assert b"Traceback" not in e.value.read()
+        assert server.metrics.counts["errors"] == 1
+    assert "KeyError: 'internal'" in caplog.text